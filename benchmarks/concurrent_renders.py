@@ -0,0 +1,36 @@
+""" Stress test of simultaneous renders: the same scenes are rendered from a
+pool of threads and from a pool of processes, and every image must be equal
+to the one obtained when rendering serially. Requires POV-Ray.
+Run with: python benchmarks/concurrent_renders.py """
+
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from vapory import Scene, Camera, LightSource, Sphere, Texture, Pigment
+
+n_renders = 32
+
+def make_scene(i):
+    return Scene(Camera('location', [0, 2, -3], 'look_at', [0, 1, 2]),
+                 objects=[LightSource([2, 4, -3], 'color', [1, 1, 1]),
+                          Sphere([0, 1, 2], 0.5 + 0.05 * (i % 8),
+                                 Texture(Pigment('color', [1, 0, 1])))])
+
+def render(i):
+    return make_scene(i).render(width=80, height=60, antialiasing=0.01)
+
+if __name__ == '__main__':
+    expected = [render(i) for i in range(8)]
+
+    # Rendering the same Scene object again must give the same image.
+    scene = make_scene(0)
+    assert all((scene.render(width=80, height=60, antialiasing=0.01) ==
+                expected[0]).all() for i in range(3))
+
+    for pool_class in [ThreadPoolExecutor, ProcessPoolExecutor]:
+        t0 = time.perf_counter()
+        with pool_class(max_workers=8) as pool:
+            images = list(pool.map(render, range(n_renders)))
+        for i, image in enumerate(images):
+            assert (image == expected[i % 8]).all(), "render %d differs" % i
+        print("%s: %d renders OK in %.2fs" % (pool_class.__name__, n_renders,
+                                              time.perf_counter() - t0))
@@ -0,0 +1,30 @@
+""" Time of Scene.add_objects, Scene.set_camera and add_args as the scene
+grows. Elements are shared between copies, so these should not depend on the
+size of the elements tree. Run with: python benchmarks/copy_on_write.py """
+
+import time
+from vapory import Scene, Camera, Sphere, Texture, Pigment, Finish
+
+def best_time(f, repeat=5):
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+camera = Camera('location', [0, 0, -10], 'look_at', [0, 0, 0])
+new_sphere = Sphere([0, 0, 0], 1)
+
+print("%10s %15s %15s %15s" % ("objects", "add_objects", "set_camera",
+                               "add_args"))
+for n_objects in [1000, 10000, 100000]:
+    spheres = [Sphere([i, 0, 0], 0.5,
+                      Texture(Finish('specular', 1), Pigment('color', [1, 0, 0])))
+               for i in range(n_objects)]
+    scene = Scene(camera, objects=spheres)
+    print("%10d %13.3fms %13.3fms %13.3fms" % (
+        n_objects,
+        1000 * best_time(lambda: scene.add_objects([new_sphere])),
+        1000 * best_time(lambda: scene.set_camera(camera)),
+        1000 * best_time(lambda: spheres[0].add_args(['translate', [1, 0, 0]]))))
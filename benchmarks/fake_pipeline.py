@@ -0,0 +1,45 @@
+""" Benchmark of the render pipeline of vapory (serialization, spawn of the
+renderer, streaming of the scene and of the image, decoding, cache) with the
+fake POV-Ray backend, so it runs on computers without POV-Ray.
+Run with: python benchmarks/fake_pipeline.py """
+
+import time
+from vapory import (Scene, Camera, LightSource, Sphere, Texture, Pigment,
+                    FakeBackend, RenderCache, render_many)
+
+def make_scene(n_spheres):
+    texture = Texture(Pigment('color', [1, 0, 1]))
+    return Scene(Camera('location', [0, 2, -3], 'look_at', [0, 1, 2]),
+                 objects=[LightSource([2, 4, -3], 'color', [1, 1, 1])] +
+                         [Sphere([0.01 * i, 1, 2], 0.5, texture)
+                          for i in range(n_spheres)])
+
+def timed(title, f, n=1):
+    t0 = time.perf_counter()
+    for i in range(n):
+        f()
+    print("%-40s %8.1f ms" % (title, 1000 * (time.perf_counter() - t0) / n))
+
+if __name__ == '__main__':
+    backend = FakeBackend()
+    small, big = make_scene(10), make_scene(100000)
+
+    timed("small scene, 80x60 (spawn overhead)",
+          lambda: small.render(width=80, height=60, backend=backend), 10)
+    timed("small scene, 1920x1080 (image streaming)",
+          lambda: small.render(width=1920, height=1080, backend=backend), 3)
+    timed("100k spheres, 80x60 (scene streaming)",
+          lambda: big.render(width=80, height=60, backend=backend), 3)
+    timed("100k spheres, serialization only", lambda: str(big), 3)
+
+    cache = RenderCache()
+    big.render(width=80, height=60, backend=backend, cache=cache)
+    timed("100k spheres, cache hit",
+          lambda: big.render(width=80, height=60, backend=backend,
+                             cache=cache), 3)
+
+    scenes = [make_scene(i) for i in range(32)]
+    for jobs in [1, 4, 8]:
+        timed("32 small renders, %d jobs" % jobs,
+              lambda: render_many(scenes, jobs=jobs, width=80, height=60,
+                                  backend=backend))
@@ -0,0 +1,28 @@
+""" Time taken by ``import vapory`` in a fresh interpreter, measured with
+``python -X importtime``. Heavy optional dependencies (numpy, IPython...)
+are imported on first use and should not appear in the list.
+Run with: python benchmarks/import_time.py """
+
+import re
+import subprocess
+import sys
+
+def import_times(module="vapory"):
+    """ Returns {module: cumulative import time in microseconds} """
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                              "import %s" % module],
+                             capture_output=True, text=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match:
+            times[match.group(3)] = int(match.group(1))
+    return times
+
+runs = [import_times() for i in range(5)]
+best = min(runs, key=lambda times: times["vapory"])
+print("import vapory: %.1f ms (best of %d)" % (best["vapory"] / 1000.0,
+                                                len(runs)))
+print("slowest imports:")
+for name, t in sorted(best.items(), key=lambda item: -item[1])[1:11]:
+    print("  %-30s %8.1f ms" % (name, t / 1000.0))
@@ -0,0 +1,19 @@
+""" Memory used by the Python objects of a scene, in bytes per primitive.
+Run with: python benchmarks/memory.py """
+
+import tracemalloc
+from vapory import Sphere, Texture, Pigment, Finish
+
+n_spheres = 100000
+
+tracemalloc.start()
+spheres = [Sphere([i, 0, 0], 0.5,
+                  Texture(Finish('ambient', 0, 'diffuse', 0.6, 'specular', 1),
+                          Pigment('color', [1, 1, 1])),
+                  'translate', [0, 1, 0])
+           for i in range(n_spheres)]
+size, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+
+print("Sphere(center, radius, Texture(Finish, Pigment), translate):"
+      " %d bytes per primitive" % (size / n_spheres))
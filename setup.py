@@ -30,4 +30,7 @@ setup(
             'docker_container/*',  # Inclut tout dans le dossier docker_container
         ]
     },
+    entry_points={
+        'console_scripts': ['vapory = vapory.__main__:main'],
+    },
 )
@@ -0,0 +1,42 @@
+""" A stand-in for the docker CLI, for the tests of DockerPool: containers
+are files in the directory $FAKE_DOCKER_STATE, ``docker exec ... povray``
+runs the fake POV-Ray, and every command is logged to
+$FAKE_DOCKER_STATE/log. """
+
+import os
+import subprocess
+import sys
+import uuid
+
+
+def main(args):
+    state = os.environ['FAKE_DOCKER_STATE']
+    with open(os.path.join(state, 'log'), 'a') as f:
+        f.write(' '.join(args) + '\n')
+    command, rest = args[0], args[1:]
+    if command == 'run':
+        container = uuid.uuid4().hex
+        open(os.path.join(state, container), 'w').close()
+        print(container)
+    elif command == 'exec':
+        while rest[0].startswith('-'):
+            rest = rest[2:] if rest[0] == '-w' else rest[1:]
+        container, cmd = rest[0], rest[1:]
+        if not os.path.exists(os.path.join(state, container)):
+            sys.stderr.write("Error: No such container: %s\n" % container)
+            return 1
+        if cmd[0] == 'povray':
+            cmd = [sys.executable, '-m', 'vapory.fake_povray'] + cmd[1:]
+        return subprocess.call(cmd)
+    elif command == 'rm':
+        for container in rest:
+            if not container.startswith('-'):
+                try:
+                    os.remove(os.path.join(state, container))
+                except FileNotFoundError:
+                    pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
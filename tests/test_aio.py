@@ -0,0 +1,66 @@
+""" Asynchronous renders, with the fake POV-Ray. """
+
+import asyncio
+import os
+import stat
+import sys
+import time
+import pytest
+from vapory import Scene, Camera, Sphere, config
+from vapory.aio import render_povstring_async
+
+numpy = pytest.importorskip('numpy')
+
+pytestmark = pytest.mark.skipif(os.name == 'nt',
+                                reason="the fake POV-Ray is run by a script")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def fake_povray(tmp_path, monkeypatch):
+    script = tmp_path / 'povray'
+    script.write_text('#!/bin/sh\nPYTHONPATH="%s" exec "%s" -m '
+                      'vapory.fake_povray "$@"\n' % (os.path.dirname(HERE),
+                                                     sys.executable))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(config, 'POVRAY_BINARY', str(script))
+
+
+def test_render(fake_povray):
+    scene = Scene(Camera('location', [0, 0, -3], 'look_at', [0, 0, 0]),
+                  [Sphere([0, 0, 0], 1)])
+    image = asyncio.run(render_povstring_async(scene, width=16, height=12))
+    assert (image == scene.render(width=16, height=12, backend='fake',
+                                  auto_camera_angle=False)).all()
+
+
+class SlowScene:
+    """ A scene taking 0.1 second to serialize. """
+
+    def iter_chunks(self):
+        yield str(Scene(Camera('location', [0, 0, -3], 'look_at', [0, 0, 0]),
+                        [Sphere([0, 0, 0], 1)]))
+        for i in range(5):
+            time.sleep(0.02)
+            yield "\n// comment %d" % i
+
+
+def test_serialization_does_not_block_the_loop(fake_povray):
+
+    async def main():
+        delays = []
+
+        async def ticker():
+            while True:
+                start = time.perf_counter()
+                await asyncio.sleep(0.001)
+                delays.append(time.perf_counter() - start)
+
+        task = asyncio.ensure_future(ticker())
+        await asyncio.sleep(0.01)
+        await render_povstring_async(SlowScene(), width=8, height=8)
+        task.cancel()
+        return delays
+
+    assert max(asyncio.run(main())) < 0.05
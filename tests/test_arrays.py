@@ -0,0 +1,21 @@
+""" Batches of objects stored in numpy columns are written like the
+equivalent lists of objects. """
+
+import pytest
+from vapory import Sphere, SphereArray, Pigment
+
+numpy = pytest.importorskip('numpy')
+
+
+def test_int_and_float_columns():
+    array = SphereArray(numpy.array([[0, 0, 0], [1, 2, 3]]),
+                        numpy.array([0.5, 1.5]))
+    assert str(array) == "\n".join([str(Sphere([0, 0, 0], 0.5)),
+                                    str(Sphere([1, 2, 3], 1.5))])
+
+
+def test_colors_column():
+    array = SphereArray(numpy.array([[0, 0, 0]]), numpy.array([1]),
+                        colors=numpy.array([[1.0, 0.5, 0.0]]))
+    expected = Sphere([0, 0, 0], 1, Pigment('color', [1.0, 0.5, 0.0]))
+    assert str(array) == str(expected)
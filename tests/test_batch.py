@@ -0,0 +1,45 @@
+""" Rendering of many scenes and POV-Ray code strings with render_many. """
+
+import threading
+import time
+import pytest
+from vapory import Scene, Camera, Sphere, FakeBackend
+from vapory.batch import render_many
+
+numpy = pytest.importorskip('numpy')
+
+
+def make_scene(radius=1):
+    return Scene(Camera('location', [0, 0, -3], 'look_at', [0, 0, 0]),
+                 objects=[Sphere([0, 0, 0], radius)])
+
+
+def test_scenes_and_strings():
+    scene = make_scene()
+    results = render_many([scene, str(scene)], jobs=2, width=16, height=12,
+                          auto_camera_angle=False, backend='fake')
+    assert (results[0] == results[1]).all()
+
+
+def test_scene_only_options_are_rejected_for_strings():
+    for option in [{'tiles': (2, 2)}, {'cache': True}]:
+        with pytest.raises(ValueError, match=list(option)[0]):
+            render_many([make_scene(), str(make_scene())], width=16,
+                        height=12, backend='fake', **option)
+
+
+def test_abandoned_iterator_cancels_the_queued_renders():
+    scenes = [make_scene(0.1 * i) for i in range(1, 9)]
+    results = render_many(scenes, jobs=1, ordered=False, width=8, height=8,
+                          backend=FakeBackend(render_time=0.2))
+    next(results)
+    start = time.time()
+    results.close()
+    assert time.time() - start < 0.5
+    time.sleep(0.5)
+    # at most the render running when the iterator was closed goes on
+    workers = [t for t in threading.enumerate()
+               if t.name.startswith('ThreadPoolExecutor')]
+    assert len(workers) <= 1
+    time.sleep(0.5)
+    assert not any(t.is_alive() for t in workers)
@@ -0,0 +1,36 @@
+""" The disk tier and the file hashes of RenderCache. """
+
+import os
+import pytest
+from vapory.cache import RenderCache
+
+
+def test_failed_render_leaves_no_file(tmp_path):
+    cache = RenderCache(directory=str(tmp_path / 'cache'))
+
+    def render(outfile):
+        with open(outfile, 'wb') as f:
+            f.write(b'partial')
+        raise IOError("POV-Ray failed")
+
+    with pytest.raises(IOError):
+        cache.render(render, 'sphere {0, 1}', str(tmp_path / 'image.png'))
+    assert os.listdir(cache.directory) == []
+
+
+def test_file_hashes_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = RenderCache()
+    cache.max_file_hashes = 3
+    keys = set()
+    for i in range(5):
+        with open('map%d.png' % i, 'wb') as f:
+            f.write(b'%d' % i)
+        keys.add(cache.key('image_map { png "map%d.png" }' % i))
+    assert len(keys) == 5
+    assert list(cache._file_hashes) == ['map2.png', 'map3.png', 'map4.png']
+    # a changed file gets a new hash
+    key = cache.key('image_map { png "map4.png" }')
+    with open('map4.png', 'wb') as f:
+        f.write(b'changed content')
+    assert cache.key('image_map { png "map4.png" }') != key
@@ -0,0 +1,51 @@
+""" Simultaneous renders of scenes (with the fake POV-Ray) must give the
+same images as serial renders, and leave the scenes untouched. """
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import pytest
+from vapory import Scene, Camera, LightSource, Sphere, Texture, Pigment
+
+numpy = pytest.importorskip('numpy')
+
+
+def make_scene(i):
+    return Scene(Camera('location', [0, 2, -3], 'look_at', [0, 1, 2]),
+                 objects=[LightSource([2, 4, -3], 'color', [1, 1, 1]),
+                          Sphere([0, 1, 2], 0.5 + 0.05 * (i % 8),
+                                 Texture(Pigment('color', [1, 0, 1])))])
+
+
+def render(i):
+    return make_scene(i).render(width=40, height=30, backend='fake')
+
+
+def test_rendering_does_not_modify_the_scene():
+    scene = make_scene(0)
+    code = str(scene)
+    first = scene.render(width=40, height=30, backend='fake')
+    assert str(scene) == code
+    second = scene.render(width=40, height=30, backend='fake')
+    assert (first == second).all()
+
+
+@pytest.mark.parametrize('pool_class', [ThreadPoolExecutor,
+                                        ProcessPoolExecutor])
+def test_concurrent_renders(pool_class):
+    expected = [render(i) for i in range(8)]
+    with pool_class(max_workers=8) as pool:
+        images = list(pool.map(render, range(32)))
+    for i, image in enumerate(images):
+        assert (image == expected[i % 8]).all(), "render %d differs" % i
+
+
+def test_concurrent_renders_of_one_scene():
+    # the camera is fitted to each image size on a copy of the scene
+    scene = make_scene(0)
+    sizes = [(40, 30), (30, 40), (64, 16)] * 4
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        images = list(pool.map(
+            lambda size: scene.render(width=size[0], height=size[1],
+                                      backend='fake'), sizes))
+    for (width, height), image in zip(sizes, images):
+        expected = scene.render(width=width, height=height, backend='fake')
+        assert (image == expected).all()
@@ -0,0 +1,94 @@
+""" End-to-end tests of the distributed rendering, with local worker
+processes using the fake POV-Ray. """
+
+import os
+import time
+import pytest
+from vapory import Scene, Camera, LightSource, Sphere, Texture, Pigment
+from vapory.distributed import Coordinator, spawn_workers
+
+numpy = pytest.importorskip('numpy')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_scene(red=1):
+    return Scene(Camera('location', [0, 2, -3], 'look_at', [0, 1, 2]),
+                 [LightSource([2, 4, -3], 'color', [1, 1, 1]),
+                  Sphere([0, 1, 2], 2, Texture(Pigment('color', [red, 0, 0])))])
+
+
+@pytest.fixture
+def coordinator(monkeypatch):
+    # the workers run "python -m vapory", which must find this vapory
+    monkeypatch.setenv('PYTHONPATH', ROOT + os.pathsep +
+                       os.environ.get('PYTHONPATH', ''))
+    workers = []
+
+    def spawn(processes=1, jobs=1):
+        new = spawn_workers(coordinator.address, processes, jobs,
+                            backend='fake')
+        workers.extend(new)
+        return new
+
+    with Coordinator(result_timeout=60) as coordinator:
+        coordinator.spawn = spawn
+        yield coordinator
+    for worker in workers:
+        try:
+            worker.wait(timeout=10)
+        except Exception:
+            worker.kill()
+
+
+def test_render_tiles(coordinator):
+    coordinator.spawn(3)
+    scene = make_scene()
+    image = coordinator.render_tiles(scene, 96, 64, tiles=(3, 2))
+    expected = scene.render(width=96, height=64, backend='fake')
+    assert (image == expected).all()
+
+
+def test_render_scenes_and_errors(coordinator):
+    coordinator.spawn(2)
+    results = coordinator.render([make_scene(0), make_scene(1), '#error "x"'],
+                                 width=16, height=16)
+    assert isinstance(results[0], numpy.ndarray)
+    assert not (results[0] == results[1]).all()
+    assert isinstance(results[2], IOError)
+
+
+def test_render_frames(coordinator):
+    coordinator.spawn(2)
+    frames = dict(coordinator.render_frames(make_scene(), range(1, 6),
+                                            width=16, height=12))
+    assert sorted(frames) == [1, 2, 3, 4, 5]
+    assert len({image.tobytes() for image in frames.values()}) == 5
+
+
+def test_lost_worker(coordinator):
+    worker, = coordinator.spawn(1, jobs=3)
+    time.sleep(1.5) # the worker's connections are open
+    results = coordinator.render([make_scene()], ordered=False, width=8,
+                                 height=8,
+                                 povray_options=['Fake_Render_Time=2'])
+    time.sleep(0.8)
+    worker.kill()
+    coordinator.spawn(1)
+    (index, image), = list(results)
+    assert isinstance(image, numpy.ndarray)
+
+
+def test_no_worker_times_out():
+    with Coordinator(result_timeout=0.5) as coordinator:
+        with pytest.raises(IOError):
+            coordinator.render([make_scene()], width=8, height=8)
+        assert not coordinator._jobs
+
+
+def test_close_fails_pending_jobs():
+    coordinator = Coordinator()
+    results = coordinator.render([make_scene()] * 2, ordered=False,
+                                 width=8, height=8)
+    coordinator.close()
+    assert all(isinstance(image, IOError) for _, image in results)
@@ -0,0 +1,138 @@
+""" Tests of DockerPool, against a stand-in docker CLI (fake_docker.py)
+put on the PATH, which runs the fake POV-Ray. """
+
+import gc
+import os
+import stat
+import sys
+import time
+import weakref
+import pytest
+from vapory import Scene, Camera, Sphere, DockerPool
+
+numpy = pytest.importorskip('numpy')
+
+pytestmark = pytest.mark.skipif(os.name == 'nt',
+                                reason="the fake docker is a shell script")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def docker(tmp_path, monkeypatch):
+    """ Puts the fake docker on the PATH, returns its state directory. """
+    state = tmp_path / 'containers'
+    state.mkdir()
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'docker'
+    script.write_text('#!/bin/sh\nexec "%s" "%s" "$@"\n' % (
+        sys.executable, os.path.join(HERE, 'fake_docker.py')))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', str(bin_dir) + os.pathsep + os.environ['PATH'])
+    monkeypatch.setenv('FAKE_DOCKER_STATE', str(state))
+    monkeypatch.setenv('PYTHONPATH', os.path.dirname(HERE) + os.pathsep +
+                       os.environ.get('PYTHONPATH', ''))
+    return state
+
+
+def containers(state):
+    return sorted(name for name in os.listdir(str(state)) if name != 'log')
+
+
+def commands(state, name):
+    with open(str(state / 'log')) as f:
+        return [line.split() for line in f if line.startswith(name + ' ')]
+
+
+def exec_container(command):
+    """ The container of a logged ``exec [options] <container> ...``. """
+    rest = command[1:]
+    while rest[0].startswith('-'):
+        rest = rest[2:] if rest[0] == '-w' else rest[1:]
+    return rest[0]
+
+
+def wait_for(condition, timeout=10):
+    # containers are removed in the background
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.05)
+
+
+def make_scene(radius=1):
+    return Scene(Camera('location', [0, 0, -3], 'look_at', [0, 0, 0]),
+                 [Sphere([0, 0, 0], radius)])
+
+
+def test_render(docker):
+    scene = make_scene()
+    with DockerPool(size=2) as pool:
+        image = scene.render(width=32, height=24, docker=pool)
+        assert (image == scene.render(width=32, height=24,
+                                      backend='fake')).all()
+        image, stats = pool.render(str(scene), width=32, height=24,
+                                   threads=3, return_stats=True)
+        assert image.shape == (24, 32, 3)
+        assert stats.threads == 3
+    wait_for(lambda: not containers(docker))
+
+
+def test_idle_container_is_reused(docker):
+    with DockerPool(size=3) as pool:
+        for radius in [1, 2, 3]:
+            make_scene(radius).render(width=8, height=8, docker=pool)
+        assert len(commands(docker, 'run')) == 1
+        used = {exec_container(command)
+                for command in commands(docker, 'exec')}
+        assert len(used) == 1
+
+
+def test_containers_are_recycled(docker):
+    with DockerPool(size=1, max_renders=2) as pool:
+        for radius in [1, 2, 3]:
+            make_scene(radius).render(width=8, height=8, docker=pool)
+        assert len(commands(docker, 'run')) == 2
+        wait_for(lambda: len(containers(docker)) == 1)
+
+
+def test_dead_container_is_replaced(docker):
+    with DockerPool(size=1, health_interval=0) as pool:
+        make_scene().render(width=8, height=8, docker=pool)
+        for container in containers(docker):
+            os.remove(str(docker / container)) # the container died
+        image = make_scene().render(width=8, height=8, docker=pool)
+        assert image.shape == (8, 8, 3)
+        # the idle container was probed, then replaced
+        assert any(command[-1] == 'true'
+                   for command in commands(docker, 'exec'))
+        assert len(commands(docker, 'run')) == 2
+
+
+def test_failed_render_keeps_a_healthy_container(docker):
+    with DockerPool(size=1) as pool:
+        with pytest.raises(IOError):
+            pool.render('#error "broken scene"', width=8, height=8)
+        make_scene().render(width=8, height=8, docker=pool)
+        assert len(commands(docker, 'run')) == 1
+
+
+def test_closed_pool(docker):
+    pool = DockerPool(size=1)
+    make_scene().render(width=8, height=8, docker=pool)
+    pool.close()
+    assert not containers(docker)
+    with pytest.raises(IOError):
+        make_scene().render(width=8, height=8, docker=pool)
+
+
+def test_unreferenced_pool_removes_its_containers(docker):
+    pool = DockerPool(size=1)
+    make_scene().render(width=8, height=8, docker=pool)
+    assert len(containers(docker)) == 1
+    reference = weakref.ref(pool)
+    del pool
+    gc.collect()
+    assert reference() is None
+    assert not containers(docker)
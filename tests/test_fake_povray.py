@@ -0,0 +1,97 @@
+""" Tests of the fake POV-Ray (vapory.fake_povray) and of FakeBackend. """
+
+import os
+import sys
+import pytest
+from vapory import Scene, Camera, Sphere, FakeBackend
+from vapory.fake_povray import parse_options, image_rows, main
+from vapory.io import render_povstring_animation
+
+
+def test_parse_options():
+    options = parse_options(['+WT4', '+W320', '+H200', '+I-', '+O-',
+                             'Output_File_Type=P', 'Output_Alpha=on',
+                             'Fake_Render_Time=0.5'])
+    assert options['WT'] == 4 # not +W with the value "T4"
+    assert (options['W'], options['H']) == (320, 200)
+    assert (options['I'], options['O']) == ('-', '-')
+    assert options['type'] == 'P'
+    assert options['alpha']
+    assert options['render_time'] == 0.5
+
+
+def test_parse_animation_options():
+    options = parse_options(['+KFI2', '+KFF10', '+KI0', '+KF1.5', '+K0.25',
+                             '+KC'])
+    assert (options['KFI'], options['KFF']) == (2, 10)
+    assert (options['KI'], options['KF'], options['K']) == (0, 1.5, 0.25)
+
+
+def test_parse_region_and_input_file():
+    options = parse_options(['scene.pov', '+SR3', '+ER8', '+SC2', '+EC5'])
+    assert options['I'] == 'scene.pov'
+    assert [options[k] for k in ['SR', 'ER', 'SC', 'EC']] == [3, 8, 2, 5]
+
+
+def test_image_rows():
+    rows = image_rows(b"sphere {}", 6, 4)
+    assert len(rows) == 4 and all(len(row) == 18 for row in rows)
+    assert rows == image_rows(b"sphere {}", 6, 4)
+    assert rows != image_rows(b"box {}", 6, 4)
+    region = image_rows(b"sphere {}", 6, 4, region=(1, 3, 2, 4))
+    assert region[0] == bytes(18)
+    assert region[1][6:12] == rows[1][6:12] and region[1][:6] == bytes(6)
+
+
+def test_output_file_names(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'scene.pov').write_text('sphere {}')
+    assert main(['scene.pov', '+W4', '+H4', '+Oimage']) == 0
+    assert main(['scene.pov', '+W4', '+H4', 'Output_File_Type=P',
+                 '+Oimage2']) == 0
+    assert main(['scene.pov', '+W4', '+H4', '+KFI1', '+KFF3',
+                 '+Oframe']) == 0
+    assert sorted(os.listdir(str(tmp_path))) == [
+        'frame1.png', 'frame2.png', 'frame3.png', 'image.png', 'image2.ppm',
+        'scene.pov']
+
+
+def test_parse_error(tmp_path, capsys):
+    (tmp_path / 'scene.pov').write_text('#error "broken"')
+    assert main([str(tmp_path / 'scene.pov')]) == 1
+    assert 'Parse Error' in capsys.readouterr().err
+
+
+def make_scene():
+    return Scene(Camera('location', [0, 0, -3], 'look_at', [0, 0, 0]),
+                 [Sphere([0, 0, 0], 1)])
+
+
+def test_fake_backend_render(tmp_path):
+    numpy = pytest.importorskip('numpy')
+    image, stats = make_scene().render(width=32, height=24, backend='fake',
+                                       threads=3, return_stats=True)
+    assert image.shape == (24, 32, 3) and image.dtype == numpy.uint8
+    assert stats.threads == 3
+    assert (stats.width, stats.height, stats.pixels) == (32, 24, 32 * 24)
+    path = str(tmp_path / 'image.png')
+    make_scene().render(path, width=32, height=24, backend=FakeBackend())
+    with open(path, 'rb') as f:
+        assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+
+
+def test_fake_backend_animation():
+    pytest.importorskip('numpy')
+    for frames in [range(1, 2), range(1, 4)]:
+        images = list(render_povstring_animation(
+            make_scene(), frames, width=8, height=8,
+            binary=FakeBackend().binary))
+        assert len(images) == len(frames)
+
+
+def test_animation_missing_frames():
+    # a "POV-Ray" exiting successfully without writing any frame
+    binary = [sys.executable, '-c', 'pass']
+    with pytest.raises(IOError, match='frame'):
+        list(render_povstring_animation(make_scene(), range(1, 3),
+                                        width=8, height=8, binary=binary))
@@ -2,3 +2,9 @@
 
 from .version import __version__
 from .vapory import *
+from .batch import render_many
+from .cache import RenderCache
+from .io import RenderCancelled, RenderTimeout, RenderProgress
+from .stats import RenderStats
+from .docker_container.pool import DockerPool
+from .backends import RenderBackend, LocalBackend, DockerBackend, FakeBackend
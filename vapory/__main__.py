@@ -0,0 +1,75 @@
+"""
+Command-line interface of vapory.
+
+    vapory serve [--socket PATH | --port PORT] [--workers N] [--backend NAME]
+
+starts a render server (see ``vapory.server``), to which scenes are sent
+with ``scene.render(..., server=address)``.
+
+    vapory worker HOST:PORT [--jobs N] [--backend NAME]
+
+renders the jobs of a distributed render (see ``vapory.distributed``).
+"""
+
+import argparse
+import sys
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='vapory')
+    commands = parser.add_subparsers(dest='command')
+    serve = commands.add_parser(
+        'serve', help="Start a render server for the scenes of all the "
+                      "processes of this computer.")
+    serve.add_argument('--socket', help="Path of the Unix socket to listen "
+                                        "on (default: vapory.sock in a "
+                                        "directory private to the user).")
+    serve.add_argument('--port', type=int,
+                       help="Listen on this TCP port instead of a socket.")
+    serve.add_argument('--host', default='127.0.0.1',
+                       help="Host for --port (default: %(default)s).")
+    serve.add_argument('--workers', type=int,
+                       help="Number of simultaneous renders (default: one "
+                            "per core).")
+    serve.add_argument('--backend', default='local',
+                       choices=['local', 'docker', 'fake'],
+                       help="Renderer (default: %(default)s).")
+    worker = commands.add_parser(
+        'worker', help="Render the jobs of a Coordinator (distributed "
+                       "rendering).")
+    worker.add_argument('coordinator', help="HOST:PORT of the coordinator.")
+    worker.add_argument('--jobs', type=int, default=1,
+                        help="Number of simultaneous renders (default: "
+                             "%(default)s).")
+    worker.add_argument('--backend', default='local',
+                        choices=['local', 'docker', 'fake'],
+                        help="Renderer (default: %(default)s).")
+    options = parser.parse_args(args)
+
+    if options.command == 'worker':
+        from .distributed import run_worker
+        host, port = options.coordinator.rsplit(':', 1)
+        run_worker((host, int(port)), options.jobs, options.backend)
+        return 0
+    if options.command != 'serve':
+        parser.print_help()
+        return 1
+
+    from .server import RenderServer
+    if options.port is not None:
+        address = (options.host, options.port)
+    else:
+        address = options.socket
+    with RenderServer(address, options.workers, options.backend) as server:
+        print("vapory: serving on %s with %d workers" % (
+            server.address if options.port is None else "%s:%d" % address,
+            server.workers), file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
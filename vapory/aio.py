@@ -0,0 +1,149 @@
+"""
+Rendering with asyncio: POV-Ray processes awaited by an event loop, without
+a thread per render.
+"""
+
+import asyncio
+import os
+import weakref
+from . import config
+from .helpers import iter_chunks, write_chunks, import_numpy
+from .io import (ppm_to_numpy, ipython_image, private_directory,
+                 render_options)
+
+# One semaphore per event loop, as asyncio objects cannot be shared between
+# loops.
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def default_semaphore():
+    """ Returns the semaphore limiting the number of simultaneous renders
+    in the running event loop to ``config.MAX_ASYNC_RENDERS``. """
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(config.MAX_ASYNC_RENDERS or
+                                              os.cpu_count() or 1)
+    return _semaphores[loop]
+
+
+async def render_povstring_async(string, outfile=None, height=None,
+                                 width=None, quality=None, antialiasing=None,
+                                 includedirs=None, output_alpha=False,
+                                 threads=None, povray_options=None,
+                                 semaphore=None):
+    """ Renders the provided scene description with POV-Ray, in a coroutine.
+
+    The scene is streamed into the stdin of POV-Ray chunk by chunk, and the
+    image read from its stdout, by the event loop. Cancelling the coroutine
+    (e.g. with ``asyncio.wait_for``) kills the POV-Ray process.
+
+    Parameters
+    ------------
+
+    semaphore
+      An ``asyncio.Semaphore`` limiting the number of POV-Ray processes
+      running at the same time. By default, the renders of an event loop
+      share one semaphore of ``config.MAX_ASYNC_RENDERS`` places. Renders
+      waiting for a place cost no thread and no process.
+
+    Other parameters are as in ``render_povstring``.
+
+    Examples
+    ---------
+
+    >>> images = await asyncio.gather(*[render_povstring_async(code)
+    ...                                 for code in scene_codes])
+    """
+    return_np_array = (outfile is None)
+    display_in_ipython = (outfile == 'ipython')
+    if return_np_array:
+        import_numpy("Function render_povstring_async")
+
+    options = render_options(height, width, quality, antialiasing,
+                             output_alpha, threads, povray_options,
+                             includedirs=includedirs)
+    options.append("Output_File_Type=%s" % ("P" if return_np_array else "N"))
+    options.append("+O%s" % ('-' if (return_np_array or display_in_ipython)
+                             else outfile))
+
+    async with (semaphore or default_semaphore()):
+        if os.name != 'nt':
+            returncode, out, err = await _run_povray(['+I-'] + options,
+                                                     string)
+        else:
+            # Windows builds of POV-Ray cannot read stdin.
+            with private_directory() as tempdir:
+                pov_file = os.path.join(tempdir, '__temp__.pov')
+                await asyncio.get_running_loop().run_in_executor(
+                    None, _write_scene, string, pov_file)
+                returncode, out, err = await _run_povray(
+                    [pov_file, '+L%s' % os.getcwd()] + options)
+
+    if returncode:
+        raise IOError("POVRay rendering failed with the following error: " +
+                      err.decode('ascii', 'replace'))
+
+    if return_np_array:
+        return ppm_to_numpy(buffer=out)
+
+    if display_in_ipython:
+        return ipython_image(data=out)
+
+
+async def _run_povray(options, source=None):
+    """ Async version of ``io.run_povray``. """
+    process = await asyncio.create_subprocess_exec(
+        config.POVRAY_BINARY, *options,
+        stdin=(asyncio.subprocess.DEVNULL if source is None
+               else asyncio.subprocess.PIPE),
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    try:
+        tasks = [process.stdout.read(), process.stderr.read()]
+        if source is not None:
+            tasks.append(_feed_stdin(process.stdin, source))
+        out, err = (await asyncio.gather(*tasks))[:2]
+        await process.wait()
+    except BaseException:
+        # Cancelled, or the scene could not be serialized.
+        if process.returncode is None:
+            process.kill()
+            await asyncio.shield(process.wait())
+        raise
+    return process.returncode, out, err
+
+
+async def _feed_stdin(stdin, source, buffer_size=2**16):
+    """ Writes the code of the scene to the stdin of POV-Ray. The scene is
+    serialized block by block in the default executor, so that the event
+    loop keeps running the other renders meanwhile. """
+    loop = asyncio.get_running_loop()
+    chunks = iter_chunks(source)
+    try:
+        while True:
+            data = await loop.run_in_executor(None, _next_block, chunks,
+                                              buffer_size)
+            if not data:
+                break
+            stdin.write(data)
+            # waits for POV-Ray to read, letting other renders progress
+            await stdin.drain()
+        stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        pass # POV-Ray stopped reading, its stderr will tell why.
+
+
+def _next_block(chunks, size):
+    """ Returns the next ``size`` characters (or more) of the chunks, as
+    UTF-8 bytes (empty at the end). """
+    buffer, total = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        total += len(chunk)
+        if total >= size:
+            break
+    return ''.join(buffer).encode('utf-8')
+
+
+def _write_scene(source, path):
+    with open(path, 'w+') as f:
+        write_chunks(iter_chunks(source), f)
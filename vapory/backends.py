@@ -0,0 +1,128 @@
+"""
+The renderers of vapory, behind one interface, so that Scene.render (and
+render_many, the render cache...) can use any of them.
+"""
+
+import sys
+from . import config
+from .io import render_povstring, render_docker
+
+
+class RenderBackend:
+    """ Base class of the renderers, for ``Scene.render(backend=...)``.
+
+    A backend implements ``render(string, outfile=None, **options)``, which
+    renders POV-Ray code (a string, or a Scene streaming it through
+    ``iter_chunks``) with the options and results of ``render_povstring``
+    (height, width, quality, antialiasing, includedirs, output_alpha,
+    threads, povray_options, rows_callback, progress_callback, cancel,
+    timeout, return_stats...), and ignores the options which have no
+    meaning for it (e.g. show_window).
+
+    Examples
+    ---------
+
+    >>> class RemoteBackend(RenderBackend):
+    ...     def render(self, string, outfile=None, **options):
+    ...         return my_render_farm.render(str(string), outfile, **options)
+    >>> scene.render(width=300, height=200, backend=RemoteBackend())
+    """
+
+    def render(self, string, outfile=None, **options):
+        raise NotImplementedError
+
+    def cache_key(self):
+        """ Returns a string identifying the images of this backend, for the
+        render cache. Backends with settings changing the images (binary,
+        docker image...) add them to the key. """
+        return '%s.%s' % (type(self).__module__, type(self).__qualname__)
+
+
+class LocalBackend(RenderBackend):
+    """ Renders with a POV-Ray binary of this computer.
+
+    ``binary`` is the POV-Ray command, as a string or a list (by default
+    ``config.POVRAY_BINARY``). """
+
+    def __init__(self, binary=None):
+        self.binary = binary
+
+    def render(self, string, outfile=None, resources_folder=None, **options):
+        return render_povstring(string, outfile, binary=self.binary,
+                                **options)
+
+    def cache_key(self):
+        return '%s %r' % (RenderBackend.cache_key(self),
+                          self.binary or config.POVRAY_BINARY)
+
+
+class DockerBackend(RenderBackend):
+    """ Renders in a new docker container for each render, with the given
+    image (by default ``config.DOCKER_IMAGE``) and resources folder. For
+    many renders, prefer a ``DockerPool`` of running containers. """
+
+    def __init__(self, resources_folder=None, image=None):
+        self.resources_folder = resources_folder
+        self.image = image
+
+    def render(self, string, outfile=None, resources_folder=None,
+               remove_temp=None, show_window=None, **options):
+        return render_docker(string, outfile, image=self.image,
+                             resources_folder=(resources_folder or
+                                               self.resources_folder),
+                             **options)
+
+    def cache_key(self):
+        return '%s %r' % (RenderBackend.cache_key(self),
+                          self.image or config.DOCKER_IMAGE)
+
+
+class FakeBackend(LocalBackend):
+    """ Renders with ``vapory.fake_povray``, a fake POV-Ray which behaves
+    like the real one (options, stdin and stdout, status lines, statistics)
+    but draws a pattern depending on the scene, quickly. For tests and
+    benchmarks on computers without POV-Ray.
+
+    ``render_time`` is the duration, in seconds, of each fake render.
+    """
+
+    def __init__(self, render_time=0):
+        LocalBackend.__init__(self, [sys.executable, '-m',
+                                     'vapory.fake_povray'])
+        self.render_time = render_time
+
+    def render(self, string, outfile=None, povray_options=None, **options):
+        if self.render_time:
+            povray_options = list(povray_options or []) + [
+                'Fake_Render_Time=%s' % self.render_time]
+        return LocalBackend.render(self, string, outfile,
+                                   povray_options=povray_options, **options)
+
+
+BACKENDS = {'local': LocalBackend, 'docker': DockerBackend,
+            'fake': FakeBackend}
+
+
+def get_backend(backend=None, docker=False, resources_folder=None):
+    """ Returns the backend for the parameters of Scene.render: a backend,
+    the name of one ('local', 'docker' or 'fake'), or None to choose from
+    ``docker`` (True, or a DockerPool). """
+    if isinstance(backend, str):
+        if backend == 'docker':
+            return DockerBackend(resources_folder)
+        return BACKENDS[backend]()
+    if backend is not None:
+        return backend
+    if hasattr(docker, 'render'):
+        return docker # a DockerPool
+    if docker:
+        return DockerBackend(resources_folder)
+    return LocalBackend()
+
+
+def backend_cache_key(backend):
+    """ Returns the cache key of the backend, also for backends which only
+    implement ``render``. """
+    if hasattr(backend, 'cache_key'):
+        return backend.cache_key()
+    return RenderBackend.cache_key(backend)
@@ -0,0 +1,202 @@
+"""
+Rendering of many scenes at once, with a bounded number of POV-Ray processes.
+"""
+
+import os
+from .io import RenderCancelled
+from .backends import get_backend
+from .helpers import import_numpy
+
+
+# Options of Scene.render which cannot be applied to a string of POV-Ray code
+SCENE_ONLY_OPTIONS = ['tiles', 'jobs', 'cache']
+
+
+def render_many(scenes_or_jobs, jobs=None, ordered=True, **options):
+    """ Renders many scenes at once, with at most ``jobs`` POV-Ray processes
+    running at the same time.
+
+    Parameters
+    ------------
+
+    scenes_or_jobs
+      A list of Scenes or POV-Ray code strings, or of dicts of render options
+      with a ``'scene'`` key, e.g. ``{'scene': scene, 'outfile': 'a.png'}``.
+
+    jobs
+      Maximal number of simultaneous renders (default: the number of cores).
+
+    ordered
+      If True, returns the list of the results, in the order of the jobs.
+      If False, returns an iterator of ``(index, result)`` pairs, yielded
+      as the renders finish.
+
+    **options
+      Render options shared by all the jobs (width, height, quality,
+      docker=True, ...), overridden by the options of each job. Unless
+      ``threads`` is given, the cores are split between the jobs, each
+      POV-Ray process getting ``cores // jobs`` render threads.
+
+    A failed render does not stop the others: its result is the exception
+    it raised, so the caller can retry or report it. Jobs of POV-Ray code
+    ignore ``auto_camera_angle``, and raise a ValueError (before anything is
+    rendered) if given one of ``SCENE_ONLY_OPTIONS``.
+
+    Examples
+    ---------
+
+    >>> images = render_many([scene.set_camera(camera) for camera in cameras],
+    ...                      jobs=4, width=300, height=200)
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    # The renders run in POV-Ray processes, the threads only feed and wait
+    # for them, so a pool of threads is enough to run them in parallel.
+    cores = os.cpu_count() or 1
+    jobs = jobs or cores
+    if options.get('threads') is None:
+        options['threads'] = max(1, cores // jobs)
+    jobs_options = [_job_options(job, options) for job in scenes_or_jobs]
+
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    futures = {executor.submit(_render_job, job_options): i
+               for i, job_options in enumerate(jobs_options)}
+
+    if ordered:
+        with executor:
+            results = [None] * len(futures)
+            for future, i in futures.items():
+                results[i] = _result_or_error(future)
+        return results
+
+    def results_as_completed():
+        try:
+            for future in as_completed(futures):
+                yield futures[future], _result_or_error(future)
+        finally:
+            # if the iterator is abandoned, the queued renders are dropped
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+    return results_as_completed()
+
+
+def render_tiles(scene, width, height, tiles=(2, 2), jobs=None, retries=1,
+                 **options):
+    """ Renders a scene as ``nx * ny`` tiles in parallel POV-Ray processes,
+    and stitches them into one numpy image of size ``(height, width)``.
+
+    Each tile is a sub-window of the full frame (POV-Ray's +SR/+ER/+SC/+EC
+    options), rendered with the camera of the full frame. Tiles which fail
+    are rendered again, up to ``retries`` times, before an IOError is raised.
+    ``jobs`` and ``options`` are as in ``render_many``.
+    """
+    numpy = import_numpy("Function render_tiles")
+    nx, ny = tiles
+    columns, rows = _tile_edges(width, nx), _tile_edges(height, ny)
+    regions = [(r0, r1, c0, c1) for r0, r1 in zip(rows[:-1], rows[1:])
+               for c0, c1 in zip(columns[:-1], columns[1:])]
+    extra_options = list(options.pop('povray_options', None) or [])
+    options.update(width=width, height=height, outfile=None)
+
+    image = None
+    errors = {}
+    pending = list(range(len(regions)))
+    for attempt in range(retries + 1):
+        results = render_many(
+            [{'scene': scene, 'povray_options': extra_options +
+              _region_options(regions[i], width, height)} for i in pending],
+            jobs=jobs, **options)
+        failed = []
+        for i, result in zip(pending, results):
+            if isinstance(result, RenderCancelled):
+                raise result # cancelled or timed out, not worth retrying
+            if isinstance(result, Exception):
+                errors[i] = result
+                failed.append(i)
+                continue
+            r0, r1, c0, c1 = regions[i]
+            tile = _crop_tile(result, regions[i], width, height)
+            if image is None:
+                image = numpy.zeros((height, width) + tile.shape[2:],
+                                    dtype=tile.dtype)
+            image[r0:r1, c0:c1] = tile
+        pending = failed
+        if not pending:
+            return image
+    raise IOError("%d tile(s) failed to render after %d attempt(s). Last "
+                  "error: %s" % (len(pending), retries + 1,
+                                 errors[pending[-1]]))
+
+
+def _tile_edges(n_pixels, n_tiles):
+    if n_pixels < 2 * n_tiles:
+        raise ValueError("Tiles must be at least 2 pixels wide, %d pixels "
+                         "cannot be split in %d tiles." % (n_pixels, n_tiles))
+    return [int(round(1.0 * i * n_pixels / n_tiles))
+            for i in range(n_tiles + 1)]
+
+
+def _region_options(region, width, height):
+    """ POV-Ray options rendering rows r0 to r1-1 and columns c0 to c1-1
+    (POV-Ray counts from 1, and reads values up to 1.0 as fractions, which
+    is why the first row and column are never written). """
+    r0, r1, c0, c1 = region
+    options = []
+    if r0 > 0: options.append('+SR%d' % (r0 + 1))
+    if r1 < height: options.append('+ER%d' % r1)
+    if c0 > 0: options.append('+SC%d' % (c0 + 1))
+    if c1 < width: options.append('+EC%d' % c1)
+    return options
+
+
+def _crop_tile(result, region, width, height):
+    """ POV-Ray outputs the rendered window either in a full-size image or
+    as the rendered rows only, depending on the version. """
+    r0, r1, c0, c1 = region
+    if result.shape[:2] == (height, width):
+        return result[r0:r1, c0:c1]
+    if result.shape[:2] == (r1 - r0, width):
+        return result[:, c0:c1]
+    return result
+
+
+def _job_options(job, options):
+    job_options = dict(options)
+    if isinstance(job, dict):
+        job_options.update(job)
+    else:
+        job_options['scene'] = job
+    if not hasattr(job_options['scene'], 'render'):
+        # POV-Ray code: there is no camera to fit
+        job_options.pop('auto_camera_angle', None)
+        unsupported = [name for name in SCENE_ONLY_OPTIONS
+                       if job_options.get(name)]
+        if unsupported:
+            raise ValueError("Option(s) %s can only be used to render Scenes, "
+                             "not POV-Ray code." % ', '.join(unsupported))
+    return job_options
+
+
+def _render_job(job_options):
+    job_options = dict(job_options)
+    scene = job_options.pop('scene')
+    if hasattr(scene, 'render'):
+        return scene.render(**job_options)
+    # A string of POV-Ray code: same options, with the names of io.py
+    if 'tempfile' in job_options:
+        job_options['temporarypovfile'] = job_options.pop('tempfile')
+    backend = job_options.pop('backend', None)
+    server = job_options.pop('server', None)
+    if server is not None:
+        from .server import RenderClient
+        backend = server if isinstance(server, RenderClient) \
+            else RenderClient(server)
+    backend = get_backend(backend, job_options.pop('docker', False),
+                          job_options.get('resources_folder'))
+    return backend.render(scene, **job_options)
+
+
+def _result_or_error(future):
+    error = future.exception()
+    return future.result() if error is None else error
@@ -0,0 +1,274 @@
+"""
+A cache of renders, addressed by the content of the scenes, so that
+identical scenes are rendered only once.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from . import config
+
+# Quoted file names in POV-Ray code: #include "file.inc", png "earth.png"...
+_QUOTED = re.compile(r'"([^"\n]+)"')
+
+# Files which can themselves reference other files.
+_SDL_EXTENSIONS = ('.inc', '.pov', '.mcr')
+
+
+class RenderCache:
+    """ A cache of renders, with a memory tier for the numpy images and a
+    disk tier for the PNG files. Both tiers are bounded in size, the least
+    recently used renders being evicted first.
+
+    The renders are identified by a hash of the scene (its content hash, or
+    the POV-Ray code for strings), of the render options, of
+    ``config.FLOAT_PRECISION``, and of the content of the files referenced in
+    the scene (includes, image maps...) found in the current directory, the
+    include directories or the resources folder.
+
+    Parameters
+    ------------
+
+    directory
+      Folder where the PNG files are cached. If None, only the numpy images
+      are cached (in memory).
+
+    max_memory
+      Maximal size, in bytes, of the numpy images kept in memory.
+
+    max_disk
+      Maximal size, in bytes, of the PNG files kept in ``directory``.
+
+    Examples
+    ---------
+
+    >>> cache = RenderCache(directory='.render_cache')
+    >>> image = scene.render(width=300, height=200, cache=cache)
+    >>> image = scene.render(width=300, height=200, cache=cache) # no POV-Ray
+    >>> cache.hits, cache.misses
+    (1, 1)
+    """
+
+    # Number of referenced files whose content hash is remembered
+    max_file_hashes = 1024
+
+    def __init__(self, directory=None, max_memory=2**28, max_disk=2**30):
+        self.directory = directory
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._file_hashes = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def render(self, render, source, outfile=None, options=None,
+               search_dirs=()):
+        """ Returns the cached result of ``render(outfile)``, the render of
+        ``source`` (a Scene or a string of POV-Ray code) with the given
+        options, or calls it and caches its result.
+
+        ``outfile`` is as in ``render_povstring``: None for a numpy image,
+        'ipython', or the name of a PNG file. ``search_dirs`` are the
+        folders where the files referenced in the scene are looked up, in
+        addition to the current directory.
+        """
+        if outfile is None:
+            key = self.key(source, 'array', options, search_dirs)
+            image = self._get_array(key)
+            if image is None:
+                image = render(None)
+                self._put_array(key, image)
+            return image.copy()
+
+        if self.directory is None:
+            return render(outfile)
+        key = self.key(source, 'png', options, search_dirs)
+        path = os.path.join(self.directory, key + '.png')
+        try:
+            os.utime(path)
+            self._count(True)
+        except FileNotFoundError:
+            self._count(False)
+            # rendered under a temporary name, so other threads or processes
+            # using the same directory never see a partial file.
+            temp_path = '%s.%d.%d.png' % (path[:-4], os.getpid(),
+                                           threading.get_ident())
+            try:
+                render(temp_path)
+                os.replace(temp_path, path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            self._evict_files()
+        if outfile == 'ipython':
+            from .io import ipython_image
+            with open(path, 'rb') as f:
+                return ipython_image(data=f.read())
+        shutil.copyfile(path, outfile)
+
+    def key(self, source, kind='array', options=None, search_dirs=()):
+        """ Returns the hex digest identifying the render of ``source``. """
+        h = hashlib.sha1(b"vapory render cache 1")
+        if isinstance(source, str):
+            h.update(b"S" + hashlib.sha1(source.encode('utf-8')).digest())
+        elif hasattr(source, 'content_hash'):
+            h.update(b"H" + source.content_hash().encode())
+        else:
+            h.update(b"S" + hashlib.sha1(
+                "".join(source.iter_chunks()).encode('utf-8')).digest())
+        h.update(repr((kind, config.POVRAY_BINARY, config.FLOAT_PRECISION,
+                       sorted((options or {}).items()))).encode('utf-8'))
+        for name, file_hash in self._referenced_files(source, search_dirs):
+            h.update(("%s:%s;" % (name, file_hash)).encode('utf-8'))
+        return h.hexdigest()
+
+    def clear(self):
+        """ Removes all the renders from the cache, and resets the counters. """
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            self.hits = self.misses = 0
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith('.png'):
+                    os.remove(os.path.join(self.directory, name))
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return hit
+
+    def _get_array(self, key):
+        with self._lock:
+            image = self._memory.get(key)
+            if image is not None:
+                self._memory.move_to_end(key)
+        self._count(image is not None)
+        return image
+
+    def _put_array(self, key, image):
+        if image.nbytes > self.max_memory:
+            return
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = image.copy()
+            self._memory_size += image.nbytes
+            while self._memory_size > self.max_memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= evicted.nbytes
+
+    def _evict_files(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.png') and entry.name.count('.') == 1:
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass # evicted by another process
+            total -= size
+
+    def _referenced_files(self, source, search_dirs):
+        """ Returns the sorted ``(name, content hash)`` of the files named in
+        the scene, or in the files it includes. Names which are not found
+        (e.g. the standard includes of POV-Ray) get no content hash. """
+        dirs = [d for d in search_dirs if d is not None]
+        names = sorted(referenced_names(source))
+        result = {}
+        while names:
+            name = names.pop()
+            if name in result:
+                continue
+            path = _find_file(name, dirs)
+            result[name] = self._file_hash(path) if path else '-'
+            if path and path.lower().endswith(_SDL_EXTENSIONS):
+                with open(path, errors='replace') as f:
+                    names.extend(_QUOTED.findall(f.read()))
+        return sorted(result.items())
+
+    def _file_hash(self, path):
+        """ Returns the content hash of the file, remembered (for the
+        ``max_file_hashes`` most recently used files) until it changes. """
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            known = self._file_hashes.get(path)
+            if known is not None and known[0] == stamp:
+                self._file_hashes.move_to_end(path)
+                return known[1]
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(2**20), b''):
+                h.update(block)
+        with self._lock:
+            self._file_hashes[path] = (stamp, h.hexdigest())
+            self._file_hashes.move_to_end(path)
+            while len(self._file_hashes) > self.max_file_hashes:
+                self._file_hashes.popitem(last=False)
+        return h.hexdigest()
+
+
+_default_cache = None
+
+def default_cache():
+    """ Returns the memory-only RenderCache used by ``render(cache=True)``. """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = RenderCache()
+    return _default_cache
+
+
+def get_cache(cache):
+    """ Returns the RenderCache for the ``cache`` parameter of the renderers:
+    a RenderCache, or True for the default cache. """
+    return default_cache() if cache is True else cache
+
+
+def referenced_names(source):
+    """ Returns the set of the quoted names (of files, mostly) in the
+    POV-Ray code of ``source``, a string or a Scene. The elements of a scene
+    are walked rather than written, so this is cheap even for big scenes. """
+    if isinstance(source, str):
+        return set(_QUOTED.findall(source))
+    if not hasattr(source, 'objects'):
+        return set(_QUOTED.findall("".join(source.iter_chunks())))
+    names = set(source.included)
+    stack = [source.camera, source.objects, source.atmospheric,
+             source.defaults, source.global_settings, source.declares]
+    seen = set()
+    while stack:
+        e = stack.pop()
+        if isinstance(e, str):
+            if '"' in e:
+                names.update(_QUOTED.findall(e))
+        elif isinstance(e, (list, tuple)):
+            stack.extend(e)
+        elif hasattr(e, 'args') and id(e) not in seen:
+            # elements shared by several objects are walked once
+            seen.add(id(e))
+            stack.extend(e.args)
+    return names
+
+
+def _find_file(name, dirs):
+    for folder in [''] + dirs:
+        path = os.path.join(folder, name)
+        if os.path.isfile(path):
+            return path
+    return None
@@ -2,6 +2,19 @@ import os
 
 POVRAY_BINARY = ("povray.exe" if os.name=='nt' else "povray")
 
+# Command of docker (can be e.g. "podman"), and image with POV-Ray used by
+# the docker renderers.
+DOCKER_BINARY = "docker"
+DOCKER_IMAGE = "jmaxwilson/povray"
+
+# Number of decimals kept when numpy arrays of floats are written to POV-Ray
+# code (see helpers.format_array). None writes every float in full.
+FLOAT_PRECISION = None
+
+# Number of POV-Ray processes run at the same time by the asyncio renderers
+# of each event loop (see aio.py). None runs one per core.
+MAX_ASYNC_RENDERS = None
+
 GLOBAL_SCENE_SETTINGS = {
     "charset"        : "ascii",
     "adc_bailout"    : "1/255",
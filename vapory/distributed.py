@@ -0,0 +1,387 @@
+"""
+Rendering on several computers: a Coordinator splits the renders (scenes,
+tiles of an image, frames of an animation) into jobs, and the workers,
+started on each node with ``vapory worker HOST:PORT``, connect to it and
+render the jobs with their own POV-Ray.
+
+Each worker connection renders one job at a time and asks for the next
+one when done, so fast nodes take more jobs than slow ones. The jobs of a
+worker which disconnects or dies are given to the other workers, and the
+results are returned as they arrive.
+"""
+
+import collections
+import os
+import queue
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from .backends import get_backend
+from .batch import _tile_edges, _region_options, _crop_tile
+from .helpers import iter_chunks, import_numpy
+from .server import _send, _receive_header, _receive_payload, _ERRORS
+
+# Render options sent to the workers.
+WORKER_OPTIONS = ['height', 'width', 'quality', 'antialiasing', 'includedirs',
+                  'output_alpha', 'threads', 'povray_options', 'timeout']
+
+
+class Coordinator:
+    """ Distributes renders to the workers which connect to it.
+
+    Parameters
+    ------------
+
+    address
+      ``(host, port)`` to listen on. The default listens on this computer
+      only, on a port chosen by the system (see ``self.address``). Use
+      ``('', port)`` to accept workers of other computers, on a trusted
+      network only: workers are not authenticated.
+
+    retries
+      Number of times a job is given to another worker after the worker
+      rendering it was lost, before the job fails with an IOError. Renders
+      failing on a worker (e.g. errors in the scene) are not retried.
+
+    result_timeout
+      Maximal number of seconds to wait for the next result of a render
+      (e.g. when no worker is connected), after which its remaining jobs
+      are cancelled and an IOError is raised. None waits forever.
+
+    Examples
+    ---------
+
+    >>> with Coordinator(('', 8790)) as coordinator:
+    ...     # on each node: vapory worker coordinator-host:8790 --jobs 4
+    ...     image = coordinator.render_tiles(scene, 1920, 1080, tiles=(8, 8))
+    ...     for frame, image in coordinator.render_frames(scene, range(1, 101),
+    ...                                                   width=640, height=480):
+    ...         save(frame, image)
+    """
+
+    def __init__(self, address=('127.0.0.1', 0), retries=2,
+                 result_timeout=None):
+        self.retries = retries
+        self.result_timeout = result_timeout
+        self.workers = 0
+        self._jobs = collections.deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._server = socketserver.ThreadingTCPServer(address, _WorkerHandler,
+                                                       bind_and_activate=False)
+        self._server.allow_reuse_address = True
+        self._server.daemon_threads = True
+        self._server.server_bind()
+        self._server.server_activate()
+        self._server.coordinator = self
+        self.address = self._server.server_address
+        threading.Thread(target=self._server.serve_forever,
+                         daemon=True).start()
+
+    def close(self):
+        """ Stops the coordinator. The workers exit once their current job is
+        done, the jobs not yet started fail with an IOError. """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            pending = list(self._jobs)
+            self._jobs.clear()
+        for job in pending:
+            job.fail("The coordinator was closed.")
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def render(self, scenes_or_jobs, ordered=True, auto_camera_angle=True,
+               **options):
+        """ Renders the scenes on the workers, as numpy arrays.
+
+        ``scenes_or_jobs``, ``ordered`` and the results are as in
+        ``render_many``: a list of the images (or of the exceptions of the
+        failed renders), or, if ``ordered`` is False, an iterator of
+        ``(index, image)`` pairs in the order in which they arrive.
+        ``options`` are render options shared by the jobs (width, height,
+        quality, threads...), overridden by those of each job.
+        """
+        results = queue.Queue()
+        jobs = []
+        codes = {} # the tiles or frames of a scene share its code
+        for index, job in enumerate(scenes_or_jobs):
+            job_options = dict(options)
+            if isinstance(job, dict):
+                job_options.update(job)
+            else:
+                job_options['scene'] = job
+            scene = job_options.pop('scene')
+            size = (job_options.get('width'), job_options.get('height'))
+            code = codes.get((id(scene), size))
+            if code is None:
+                code = codes[id(scene), size] = _code(scene, size,
+                                                      auto_camera_angle)
+            jobs.append(_Job(index, code,
+                             {k: job_options[k] for k in WORKER_OPTIONS
+                              if job_options.get(k) is not None}, results))
+        with self._condition:
+            self._jobs.extend(jobs)
+            self._condition.notify_all()
+
+        def results_as_received():
+            for _ in jobs:
+                try:
+                    result = results.get(timeout=self.result_timeout)
+                except queue.Empty:
+                    with self._condition:
+                        self._jobs = collections.deque(
+                            job for job in self._jobs
+                            if job.results is not results)
+                    raise IOError("No result received in %s seconds (%d "
+                                  "workers connected)." % (
+                                      self.result_timeout, self.workers))
+                yield result
+
+        if ordered:
+            images = [None] * len(jobs)
+            for index, image in results_as_received():
+                images[index] = image
+            return images
+        return results_as_received()
+
+    def render_tiles(self, scene, width, height, tiles=(4, 4), **options):
+        """ Renders the scene as ``nx * ny`` tiles on the workers, and
+        returns the stitched image (see ``render_tiles``). """
+        numpy = import_numpy("Coordinator.render_tiles")
+        nx, ny = tiles
+        columns, rows = _tile_edges(width, nx), _tile_edges(height, ny)
+        regions = [(r0, r1, c0, c1) for r0, r1 in zip(rows[:-1], rows[1:])
+                   for c0, c1 in zip(columns[:-1], columns[1:])]
+        extra_options = list(options.pop('povray_options', None) or [])
+        if options.pop('auto_camera_angle', True):
+            scene = scene._camera_fitted(width, height)
+        image = None
+        results = self.render(
+            [{'scene': scene, 'povray_options': extra_options +
+              _region_options(region, width, height)} for region in regions],
+            ordered=False, auto_camera_angle=False, width=width,
+            height=height, **options)
+        for i, tile in results:
+            if isinstance(tile, Exception):
+                raise tile
+            r0, r1, c0, c1 = regions[i]
+            tile = _crop_tile(tile, regions[i], width, height)
+            if image is None:
+                image = numpy.zeros((height, width) + tile.shape[2:],
+                                    dtype=tile.dtype)
+            image[r0:r1, c0:c1] = tile
+        return image
+
+    def render_frames(self, scene, frames, clock=(0, 1), cyclic=False,
+                      ordered=False, **options):
+        """ Renders the frames of an animation on the workers, and yields
+        ``(frame, image)`` pairs as they arrive (in the order of the frames
+        if ``ordered`` is True).
+
+        As in ``Scene.render_animation``, the scene is animated with the
+        POV-Ray variable ``clock``, going from ``clock[0]`` at the first
+        frame to ``clock[1]`` at the last (one step before if ``cyclic``).
+        Each frame is rendered separately, with its ``clock`` value and its
+        ``frame_number``.
+        """
+        frames = list(range(frames) if isinstance(frames, int) else frames)
+        if not frames:
+            raise ValueError("No frames to render.")
+        first, last = min(frames), max(frames)
+        steps = (last - first) + (1 if cyclic else 0)
+        extra_options = list(options.pop('povray_options', None) or [])
+        jobs = []
+        for frame in frames:
+            value = clock[0] + ((clock[1] - clock[0]) * (frame - first) /
+                                steps if steps else 0)
+            # a one-frame animation: frame_number is the frame, and clock
+            # goes from value to value.
+            jobs.append({'scene': scene, 'povray_options': extra_options + [
+                '+KFI%d' % frame, '+KFF%d' % frame,
+                '+KI%s' % float(value), '+KF%s' % float(value)]})
+        results = self.render(jobs, ordered=ordered, **options)
+        if ordered:
+            return zip(frames, results)
+        return ((frames[i], image) for i, image in results)
+
+    def _next_job(self):
+        with self._condition:
+            while not self._jobs and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                return None
+            return self._jobs.popleft()
+
+    def _lost(self, job, started=True):
+        """ The worker given the job was lost. Only the jobs it had started
+        count as attempts. """
+        if started:
+            job.attempts += 1
+        if job.attempts > self.retries:
+            job.fail("Job %d failed: %d workers rendering it were lost." % (
+                job.index, job.attempts))
+            return
+        with self._condition:
+            if not self._closed:
+                self._jobs.appendleft(job)
+                self._condition.notify()
+                return
+        job.fail("The coordinator was closed.")
+
+
+class _Job:
+    __slots__ = ('index', 'code', 'options', 'results', 'attempts')
+
+    def __init__(self, index, code, options, results):
+        self.index = index
+        self.code = code
+        self.options = options
+        self.results = results
+        self.attempts = 0
+
+    def fail(self, message):
+        self.results.put((self.index, IOError(message)))
+
+
+class _WorkerHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        sock = self.request
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        with coordinator._condition:
+            coordinator.workers += 1
+        try:
+            while True:
+                # A job is only sent to a worker asking for one, and only
+                # counts as attempted once the worker has accepted it.
+                try:
+                    _receive(sock) # {'ready': True}
+                except (OSError, EOFError):
+                    return
+                job = coordinator._next_job()
+                if job is None:
+                    return
+                try:
+                    _send(sock, {'options': job.options}, [job.code])
+                    _receive(sock) # {'accepted': True}
+                except (OSError, EOFError):
+                    coordinator._lost(job, started=False)
+                    return
+                try:
+                    response, payload = _receive(sock)
+                except (OSError, EOFError):
+                    coordinator._lost(job)
+                    return
+                job.results.put((job.index, _result(response, payload)))
+        finally:
+            with coordinator._condition:
+                coordinator.workers -= 1
+
+
+def _receive(sock):
+    """ Returns the header and the payload of the next message. """
+    return _receive_header(sock), _receive_payload(sock)
+
+
+def _code(scene, size, auto_camera_angle):
+    if auto_camera_angle and hasattr(scene, '_camera_fitted'):
+        scene = scene._camera_fitted(*size)
+    return ''.join(iter_chunks(scene)).encode('utf-8')
+
+
+def _result(response, payload):
+    if 'error' in response:
+        return _ERRORS.get(response['type'], IOError)(response['error'])
+    numpy = import_numpy("Distributed rendering")
+    return numpy.frombuffer(payload, dtype=response['dtype']).reshape(
+        response['shape'])
+
+
+def run_worker(address, jobs=1, backend=None, wait=30):
+    """ Renders the jobs of the coordinator at ``(host, port)`` with ``jobs``
+    connections (i.e. simultaneous renders), until the coordinator stops.
+
+    ``backend`` is the renderer (a RenderBackend or the name of one), and
+    ``wait`` the number of seconds during which to retry connecting to a
+    coordinator not yet started. Unless the jobs set ``threads``, the cores
+    are split between the connections, as in ``render_many``.
+    """
+    backend = get_backend(backend)
+    render_threads = max(1, (os.cpu_count() or 1) // jobs)
+    threads = [threading.Thread(target=_work, args=(address, backend, wait,
+                                                    render_threads))
+               for _ in range(jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def _work(address, backend, wait, threads):
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            sock = socket.create_connection(address)
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+    with sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        while True:
+            try:
+                _send(sock, {'ready': True})
+                header, code = _receive(sock)
+                _send(sock, {'accepted': True})
+            except (OSError, EOFError):
+                return # the coordinator stopped
+            options = dict(header['options'])
+            options.setdefault('threads', threads)
+            try:
+                image = backend.render(code.decode('utf-8'), None, **options)
+            except Exception as error:
+                response = {'error': str(error), 'type': type(error).__name__}
+                payload = []
+            else:
+                response = {'dtype': image.dtype.str, 'shape': image.shape}
+                payload = [image.tobytes()]
+            try:
+                _send(sock, response, payload)
+            except OSError:
+                return # the coordinator stopped
+
+
+def spawn_workers(address, processes=None, jobs=1, backend=None):
+    """ Starts worker processes on this computer (``processes`` of them, by
+    default one per core), connecting to the coordinator at ``address``.
+    Returns the list of the ``subprocess.Popen`` of the workers.
+
+    Examples
+    ---------
+
+    >>> with Coordinator() as coordinator:
+    ...     workers = spawn_workers(coordinator.address, 4, backend='fake')
+    ...     images = coordinator.render(scenes, width=320, height=240)
+    >>> for worker in workers:
+    ...     worker.wait()
+    """
+    processes = processes or os.cpu_count() or 1
+    host, port = address[:2]
+    cmd = [sys.executable, '-m', 'vapory', 'worker',
+           '%s:%d' % (host if host not in ('', '0.0.0.0') else 'localhost',
+                      port), '--jobs', str(jobs)]
+    if backend is not None:
+        cmd += ['--backend', backend]
+    return [subprocess.Popen(cmd) for _ in range(processes)]
@@ -0,0 +1,237 @@
+"""
+A pool of long-lived POV-Ray containers, which render scenes through
+``docker exec`` instead of starting a container per render.
+"""
+
+import os
+import queue
+import subprocess
+import threading
+import time
+import uuid
+import weakref
+from .. import config
+from ..io import run_povray, read_ppm, ipython_image, render_options
+from ..stats import RenderStats
+from ..backends import RenderBackend
+
+
+class _Container:
+    __slots__ = ('id', 'renders', 'checked_at')
+
+    def __init__(self, id):
+        self.id = id
+        self.renders = 0
+        self.checked_at = time.monotonic()
+
+
+class DockerPool(RenderBackend):
+    """ A pool of POV-Ray containers started once and reused for many
+    renders, each render being a ``docker exec`` of POV-Ray in an idle
+    container, with the scene piped to its stdin and the image read from
+    its stdout.
+
+    Parameters
+    ------------
+
+    size
+      Number of containers, i.e. of renders running at the same time
+      (default: one per 4 cores). Containers are started when first needed.
+
+    image
+      Docker image with a ``povray`` binary (default:
+      ``config.DOCKER_IMAGE``).
+
+    resources_folder
+      Folder of the scene's resources (textures, includes...), mounted
+      read-only in the containers, where POV-Ray runs.
+
+    volumes
+      Other folders to mount, as ``{host_path: container_path}``.
+
+    max_renders
+      Number of renders after which a container is replaced by a new one.
+
+    health_interval
+      A container idle for more than this many seconds is checked (with a
+      ``docker exec ... true``) before being used, and replaced if it does
+      not answer.
+
+    docker
+      The docker command (default: ``config.DOCKER_BINARY``), e.g.
+      'podman' or a stand-in for tests.
+
+    Examples
+    ---------
+
+    >>> with DockerPool(size=4, resources_folder='textures') as pool:
+    ...     images = render_many(scenes, jobs=4, docker=pool)
+    """
+
+    def __init__(self, size=None, image=None,
+                 resources_folder=None, volumes=None, max_renders=500,
+                 health_interval=30, docker=None):
+        self.size = size or max(1, (os.cpu_count() or 1) // 4)
+        self.image = image or config.DOCKER_IMAGE
+        self.resources_folder = resources_folder
+        self.volumes = dict(volumes or {})
+        self.max_renders = max_renders
+        self.health_interval = health_interval
+        self.docker = docker or config.DOCKER_BINARY
+        self.name = 'vapory_pool_%s' % uuid.uuid4().hex[:8]
+        self._idle = queue.LifoQueue()
+        self._places = threading.Semaphore(self.size)
+        self._containers = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        # removes the containers at exit, or when the pool is garbage
+        # collected, without keeping the pool alive until then
+        self._finalizer = weakref.finalize(self, _remove_containers,
+                                           self.docker, self._containers,
+                                           self._lock)
+
+    def render(self, string, outfile=None, height=None, width=None,
+               quality=None, antialiasing=None, includedirs=None,
+               output_alpha=False, threads=None, povray_options=None,
+               rows_callback=None, progress_callback=None, cancel=None,
+               timeout=None, return_stats=False, **other_options):
+        """ Renders the scene (a Scene or a string of POV-Ray code) in one of
+        the containers. Parameters and results are as in
+        ``render_povstring``. ``includedirs`` are paths in the container.
+        Other options of the local renderer (show_window...) are ignored.
+        """
+        return_np_array = (outfile is None)
+        if threads is None:
+            threads = max(1, (os.cpu_count() or 1) // self.size)
+        options = (render_options(height, width, quality, antialiasing,
+                                  output_alpha, threads, povray_options,
+                                  includedirs=includedirs) +
+                   ["Output_File_Type=%s" % ("P" if return_np_array else "N"),
+                    "+O-"])
+
+        container = self._acquire()
+        healthy = False
+        try:
+            cmd = [self.docker, 'exec', '-i']
+            if self.resources_folder is not None:
+                cmd += ['-w', '/resources']
+            cmd += [container.id, 'povray', '+I-'] + options
+            returncode, out, err = run_povray(
+                cmd, string,
+                (lambda stdout: read_ppm(stdout, rows_callback))
+                if return_np_array else None,
+                progress_callback, width, cancel, timeout)
+            # A failed render may be the scene's fault or the container's.
+            healthy = (returncode == 0) or self._is_healthy(container)
+        finally:
+            # A cancelled render only stops the docker client, POV-Ray may
+            # still be running in the container, which is then replaced.
+            self._release(container, healthy)
+
+        if returncode:
+            raise IOError("POVRay rendering failed with the following error: "
+                          + err.decode('ascii', 'replace'))
+        if return_np_array:
+            result = out
+        elif outfile == 'ipython':
+            result = ipython_image(data=out)
+        else:
+            with open(outfile, 'wb') as f:
+                f.write(out)
+            result = None
+        if return_stats:
+            return result, RenderStats.parse(err)
+        return result
+
+    def cache_key(self):
+        return '%s %r' % (RenderBackend.cache_key(self), self.image)
+
+    def close(self):
+        """ Stops and removes all the containers of the pool. """
+        with self._lock:
+            self._closed = True
+        _remove_containers(self.docker, self._containers, self._lock)
+        self._finalizer.detach()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _acquire(self):
+        self._places.acquire()
+        try:
+            while True:
+                try:
+                    container = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._start_container()
+                idle_for = time.monotonic() - container.checked_at
+                if idle_for < self.health_interval or \
+                        self._is_healthy(container):
+                    return container
+                self._remove_container(container)
+        except BaseException:
+            self._places.release()
+            raise
+
+    def _release(self, container, healthy):
+        container.renders += 1
+        container.checked_at = time.monotonic()
+        if healthy and container.renders < self.max_renders and \
+                not self._closed:
+            self._idle.put(container)
+        else:
+            self._remove_container(container)
+        self._places.release()
+
+    def _start_container(self):
+        if self._closed:
+            raise IOError("The DockerPool is closed.")
+        cmd = [self.docker, 'run', '-d', '--rm', '--entrypoint', 'sleep',
+               '--label', 'vapory_pool=%s' % self.name]
+        volumes = dict(self.volumes)
+        if self.resources_folder is not None:
+            volumes[os.path.abspath(self.resources_folder)] = '/resources:ro'
+        for host_path, container_path in volumes.items():
+            cmd += ['-v', '%s:%s' % (host_path, container_path)]
+        cmd += [self.image, 'infinity']
+        process = subprocess.run(cmd, stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+        if process.returncode:
+            raise IOError("Could not start a POV-Ray container: " +
+                          process.stderr.decode('utf-8', 'replace'))
+        container = _Container(process.stdout.decode().strip())
+        with self._lock:
+            self._containers.add(container)
+        return container
+
+    def _remove_container(self, container):
+        with self._lock:
+            self._containers.discard(container)
+        # in the background, the render does not wait for the container
+        threading.Thread(target=subprocess.run, daemon=True,
+                         args=([self.docker, 'rm', '-f', container.id],),
+                         kwargs=dict(stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.DEVNULL)).start()
+
+    def _is_healthy(self, container):
+        try:
+            process = subprocess.run(
+                [self.docker, 'exec', container.id, 'true'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                timeout=10)
+        except subprocess.TimeoutExpired:
+            return False
+        return process.returncode == 0
+
+
+def _remove_containers(docker, containers, lock):
+    """ Stops and removes the containers (a set, emptied). """
+    with lock:
+        ids = [c.id for c in containers]
+        containers.clear()
+    if ids:
+        subprocess.run([docker, 'rm', '-f'] + ids, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
@@ -0,0 +1,203 @@
+"""
+A fake POV-Ray, for testing and benchmarking vapory without POV-Ray.
+
+It takes the same command-line options as POV-Ray, reads the scene (from a
+file or stdin), and writes a deterministic image, which depends on the
+scene, as PPM or PNG (to a file or stdout), with POV-Ray-like status lines
+and statistics on stderr. It only uses the standard library.
+
+    python -m vapory.fake_povray +I- +W320 +H240 Output_File_Type=P +O-
+
+Besides the usual options, ``Fake_Render_Time=<seconds>`` makes the
+"render" last that long, and a scene containing ``#error`` fails like a
+parse error.
+"""
+
+import hashlib
+import os
+import re
+import struct
+import sys
+import time
+import zlib
+
+# longer names first: +WT4 is not +W with the value "T4"
+_OPTION = re.compile(r"^[+-](WT|W|H|I|O|SR|ER|SC|EC|KFI|KFF|KI|KF|K(?=[-\d.]))"
+                     r"(.*)$")
+
+
+def parse_options(args):
+    """ Returns a dict of the options (of POV-Ray syntax) the fake needs. """
+    options = {'W': 320, 'H': 240, 'I': None, 'O': None, 'type': 'N',
+               'render_time': 0.0, 'alpha': False}
+    for arg in args:
+        match = _OPTION.match(arg)
+        if match:
+            name, value = match.groups()
+            if name in ('I', 'O'):
+                options[name] = value
+            elif name in ('KI', 'KF', 'K'):
+                options[name] = float(value)
+            elif value.isdigit():
+                options[name] = int(value)
+        elif arg.lower().startswith('output_file_type='):
+            options['type'] = arg.split('=', 1)[1].upper()
+        elif arg.lower().startswith('fake_render_time='):
+            options['render_time'] = float(arg.split('=', 1)[1])
+        elif arg.lower() == 'output_alpha=on':
+            options['alpha'] = True
+        elif not arg.startswith(('+', '-')) and '=' not in arg:
+            options['I'] = arg
+    return options
+
+
+def image_rows(scene, width, height, frame=0, region=None):
+    """ Returns the rows (bytes, RGB) of the image of the scene, a pattern
+    depending only on the scene, the frame (or clock value) and the image
+    size. Rows and columns outside of the ``(r0, r1, c0, c1)`` region are
+    black. """
+    digest = hashlib.sha1(scene + str(frame).encode()).digest()
+    base = bytearray()
+    for x in range(2 * width):
+        base += bytes(((x * digest[0] + digest[1]) % 256,
+                       (x * digest[2] + digest[3]) % 256, digest[4]))
+    base = bytes(base)
+    r0, r1, c0, c1 = region or (0, height, 0, width)
+    black = bytes(3 * width)
+    rows = []
+    for y in range(height):
+        if not r0 <= y < r1:
+            rows.append(black)
+            continue
+        # each row is the base pattern shifted by a row-dependent offset
+        shift = 3 * ((y * digest[5]) % width)
+        row = base[shift:shift + 3 * width]
+        if (c0, c1) != (0, width):
+            row = black[:3 * c0] + row[3 * c0:3 * c1] + black[3 * c1:]
+        rows.append(row)
+    return rows
+
+
+def ppm(width, height, rows):
+    return b"P6\n%d %d\n255\n" % (width, height) + b''.join(rows)
+
+
+def png(width, height, rows):
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+    raw = b''.join(b'\x00' + row for row in rows)
+    return b''.join([b'\x89PNG\r\n\x1a\n',
+                     chunk(b'IHDR', struct.pack('>IIBBBBB', width, height,
+                                                8, 2, 0, 0, 0)),
+                     chunk(b'IDAT', zlib.compress(raw, 1)),
+                     chunk(b'IEND', b'')])
+
+
+def statistics(scene, width, height, parse_time, trace_time, threads):
+    """ Returns POV-Ray-like statistics for the scene. """
+    pixels = width * height
+    objects = scene.count(b'{')
+    rays = pixels + (pixels * min(objects, 10)) // 10
+    dashes = "-" * 76
+    return "\n".join([
+        "Parser Statistics", dashes,
+        "Finite Objects:   %9d" % objects, dashes,
+        "Parser Time",
+        _time_line("Parse", parse_time, 1),
+        _time_line("Bounding", 0.0, 1), dashes,
+        "Render Statistics",
+        "Image Resolution %d x %d" % (width, height), dashes,
+        "Pixels:  %15d   Samples:  %15d   Smpls/Pxl: 1.00" % (pixels, pixels),
+        "Rays:    %15d   Saved:    %15d   Max Level: 1/5" % (rays, 0), dashes,
+        "Ray->Shape Intersection          Tests       Succeeded  Percentage",
+        dashes,
+        "Sphere             %19d %15d %11.2f" % (rays, rays // 2, 50.0),
+        "Bounding Box       %19d %15d %11.2f" % (2 * rays, rays, 50.0),
+        dashes,
+        "Shadow Ray Tests:   %12d   Succeeded:   %12d" % (pixels, 0), dashes,
+        "Peak memory used:    %12d bytes" % (len(scene) + 3 * pixels + 2**20),
+        dashes,
+        "Render Time:",
+        "  Photon Time:      No photons",
+        "  Radiosity Time:   No radiosity",
+        _time_line("Trace", trace_time, threads),
+        "POV-Ray finished", ""])
+
+
+def _time_line(name, seconds, threads):
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return ("  %-16s %d hours %2d minutes %2d seconds (%.3f seconds)\n"
+            "              using %d thread(s) with %.3f CPU-seconds total" % (
+                name + " Time:", hours, minutes, secs, seconds, threads,
+                seconds * threads))
+
+
+def main(args=None):
+    options = parse_options(sys.argv[1:] if args is None else args)
+    err = sys.stderr
+
+    start = time.time()
+    err.write("==== [Parsing...] ==========\n")
+    if options['I'] in (None, '-'):
+        scene = sys.stdin.buffer.read()
+    else:
+        with open(options['I'], 'rb') as f:
+            scene = f.read()
+    err.write("Parsing %dK tokens\n" % (len(scene) // 4000))
+    if b'#error' in scene:
+        err.write("Parse Error: #error directive in the scene\n")
+        err.write("Fatal error in parser: Uncategorized error.\n")
+        err.flush()
+        return 1
+    parse_time = time.time() - start
+
+    width, height = options['W'], options['H']
+    region = None
+    if any(k in options for k in ('SR', 'ER', 'SC', 'EC')):
+        region = (options.get('SR', 1) - 1, options.get('ER', height),
+                  options.get('SC', 1) - 1, options.get('EC', width))
+    write = ppm if options['type'] == 'P' else png
+    threads = options.get('WT', os.cpu_count() or 1)
+
+    first, last = options.get('KFI', 1), options.get('KFF', 1)
+    frames = range(first, last + 1)
+    for frame in frames:
+        start = time.time()
+        err.write("==== [Rendering...] ========\n")
+        pixels = width * height
+        for i in range(1, 5):
+            err.write("Rendered %d of %d pixels (%d%%)\r" % (
+                pixels * i // 4, pixels, 25 * i))
+            err.flush()
+            time.sleep(options['render_time'] / 4)
+        err.write("\n")
+        data = write(width, height, image_rows(scene, width, height,
+                                               options.get('K', frame),
+                                               region))
+        output = options['O']
+        if output == '-':
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+        else:
+            extension = '.ppm' if options['type'] == 'P' else '.png'
+            if output is None:
+                output = os.path.splitext(os.path.basename(
+                    options['I'] or 'stdin'))[0]
+            # like POV-Ray, adds the extension to a name without one
+            root, given_extension = os.path.splitext(output)
+            extension = given_extension or extension
+            if len(frames) > 1:
+                root = "%s%0*d" % (root, len(str(last)), frame)
+            output = root + extension
+            with open(output, 'wb') as f:
+                f.write(data)
+        err.write(statistics(scene, width, height, parse_time,
+                             time.time() - start, threads))
+        err.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
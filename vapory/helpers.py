@@ -1,17 +1,142 @@
+import io
+import numbers
+import re
+import sys
+from . import config
+
+
 WIKIREF = "http://wiki.povray.org/content/Reference:"
 
-def vectorize(arr):
+def import_numpy(feature):
+    """ Imports numpy when a feature first needs it, so that importing
+    vapory stays fast. Raises an IOError if numpy is not installed. """
+    try:
+        import numpy
+    except ImportError:
+        raise IOError("%s requires numpy installed." % feature)
+    return numpy
+
+def is_numpy_array(e):
+    """ True if e is a numpy array. Does not import numpy: if numpy has not
+    been imported yet, there cannot be any numpy array around (nor while
+    numpy is being imported by another thread, hence the getattr). """
+    ndarray = getattr(sys.modules.get('numpy'), 'ndarray', None)
+    return ndarray is not None and isinstance(e, ndarray)
+
+def vectorize(arr, precision=None):
     """ transforms [a, b, c] into string "<a, b, c>"" """
+    if is_numpy_array(arr):
+        return format_array(arr, precision)
     return "<%s>" % ",".join([str(e) for e in arr])
 
+def format_array(arr, precision=None, row=None):
+    """ Formats a whole numpy array in one vectorized pass.
+
+    A 1-D array becomes "<a,b,c>", a (N, k) array becomes N such vectors,
+    one per line (higher dimensions are flattened to (N, k)). Numbers are
+    written like ``str()`` would, unless ``precision`` (default:
+    ``config.FLOAT_PRECISION``) sets a fixed number of decimals for floats.
+    ``row`` replaces the "<%s,...,%s>" template used for each row, with one
+    "%s" per value of the row.
+    """
+    numpy = import_numpy("format_array")
+    arr = numpy.asarray(arr)
+    if arr.ndim == 0:
+        return format_if_necessary(arr.item())
+    fmt, arr = value_format(arr, precision)
+    n_rows = int(numpy.prod(arr.shape[:-1]))
+    if row is None:
+        row = "<%s>" % ",".join([fmt] * arr.shape[-1])
+    elif fmt != "%s":
+        row = re.sub(r"(?<!%)((?:%%)*)%s", r"\g<1>" + fmt, row)
+    return "\n".join([row] * n_rows) % tuple(arr.ravel().tolist())
+
+def value_format(arr, precision=None):
+    """ Returns ``(fmt, arr)``, the format of the values of a numpy array
+    for ``format_array``, and the array to format with it. """
+    if precision is None:
+        precision = config.FLOAT_PRECISION
+    fmt = "%s"
+    if arr.dtype.kind == 'f':
+        if precision is not None:
+            fmt = "%%.%df" % precision
+        elif arr.dtype.itemsize < 8:
+            # float32 values converted to Python floats would print with
+            # spurious digits, numpy prints them like str(numpy.float32(x))
+            arr = arr.astype(str)
+    return fmt, arr
+
+class FormattedArray:
+    """ A numpy array written with a custom template for each of its rows,
+    e.g. "<%s,%s,%s>\\n%s" for face indices followed by a texture index. """
+
+    __slots__ = ('array', 'row')
+
+    def __init__(self, array, row):
+        self.array = array
+        self.row = row
+
+    def __str__(self):
+        return format_array(self.array, row=self.row)
+
 def format_if_necessary(e):
     """ If necessary, replaces -3 by (-3), and [a, b, c] by <a, b, c> """
 
-    if isinstance(e, (int, float)) and e<0:
+    if isinstance(e, numbers.Real) and e<0:
         # This format because POVray interprets -3 as a substraction
+        # (numbers.Real also covers numpy scalars like float32 or int64)
         return "( %s )"%str(e)
     if hasattr(e, '__iter__') and not isinstance(e, str):
         # lists, tuples, numpy arrays, become '<a,b,c,d >'
         return vectorize(e)
     else:
         return e
+
+def update_hash(h, e):
+    """ Feeds an argument of a POV-Ray element to the hashlib object ``h``.
+
+    Elements contribute their own (cached) content hash, so that the hash of
+    a tree is computed Merkle-style. Numpy arrays are hashed from their raw
+    data rather than from their formatted text.
+    """
+    if hasattr(e, 'content_hash'):
+        h.update(b"E" + e.content_hash().encode())
+    elif isinstance(e, str):
+        data = e.encode('utf-8')
+        h.update(b"S%d:" % len(data) + data)
+    elif isinstance(e, FormattedArray):
+        h.update(b"F" + e.row.encode('utf-8'))
+        update_hash(h, e.array)
+    elif is_numpy_array(e):
+        e = sys.modules['numpy'].ascontiguousarray(e)
+        h.update(("A%s%s:" % (e.dtype.str, e.shape)).encode())
+        h.update(e.data if e.dtype.kind != 'O' else repr(e.tolist()).encode())
+    elif isinstance(e, (list, tuple)):
+        h.update(b"L%d:" % len(e))
+        for item in e:
+            update_hash(h, item)
+    else:
+        h.update(("R%s:%r;" % (type(e).__qualname__, e)).encode('utf-8'))
+
+def iter_chunks(source):
+    """ Returns an iterator over the POV-Ray code of ``source``, which can be
+    a string or any object with an ``iter_chunks`` method (e.g. a Scene). """
+    if isinstance(source, str):
+        return iter([source])
+    return source.iter_chunks()
+
+def write_chunks(chunks, fileobj, buffer_size=2**16):
+    """ Writes the chunks to a text or binary file object, in writes of
+    about ``buffer_size`` characters so that memory use stays bounded. """
+    binary = not isinstance(fileobj, io.TextIOBase)
+    buffer, size = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= buffer_size:
+            data = "".join(buffer)
+            fileobj.write(data.encode('utf-8') if binary else data)
+            buffer, size = [], 0
+    if buffer:
+        data = "".join(buffer)
+        fileobj.write(data.encode('utf-8') if binary else data)
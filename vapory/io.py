@@ -9,55 +9,397 @@ import subprocess
 from pathlib import Path
 import tempfile
 from typing import List, Optional
-from .config import POVRAY_BINARY
+from contextlib import contextmanager, nullcontext
+import threading
+import struct
+import zlib
+import time
+import uuid
+import warnings
+from . import config
+from .helpers import iter_chunks, write_chunks, import_numpy
+from .cache import get_cache
+from .stats import RenderStats
 
-try:
-    import numpy
-    numpy_found=True
-except:
-    numpy_found=False
-
-try:
-    from IPython.display import Image
-    ipython_found=True
-except:
-    ipython_found=False
 
 def ppm_to_numpy(filename=None, buffer=None, byteorder='>'):
     """Return image data from a raw PGM/PPM file as numpy array.
 
     Format specification: http://netpbm.sourceforge.net/doc/pgm.html
 
+    Color (P6) images have shape ``(height, width, 3)``, grayscale (P5)
+    images have shape ``(height, width)``.
     """
 
-    if not numpy_found:
-        raise IOError("Function ppm_to_numpy requires numpy installed.")
+    numpy = import_numpy("Function ppm_to_numpy")
 
     if buffer is None:
         with open(filename, 'rb') as f:
-            buffer = f.read()
+            return read_ppm(f, byteorder=byteorder)
     try:
-        header, width, height, maxval = re.search(
-            b"(^P\d\s(?:\s*#.*[\r\n])*"
-            b"(\d+)\s(?:\s*#.*[\r\n])*"
-            b"(\d+)\s(?:\s*#.*[\r\n])*"
-            b"(\d+)\s(?:\s*#.*[\r\n]\s)*)", buffer).groups()
+        header, magic, width, height, maxval = re.search(
+            rb"(^(P[56])\s(?:\s*#.*[\r\n])*"
+            rb"(\d+)\s(?:\s*#.*[\r\n])*"
+            rb"(\d+)\s(?:\s*#.*[\r\n])*"
+            rb"(\d+)\s(?:\s*#.*[\r\n]\s)*)", buffer).groups()
     except AttributeError:
         raise ValueError("Not a raw PPM/PGM file: '%s'" % filename)
 
-    cols_per_pixels = 1 if header.startswith(b"P5") else 3
-
-    dtype = 'uint8' if int(maxval) < 256 else byteorder+'uint16'
+    shape = _ppm_shape(magic, int(width), int(height))
+    dtype = 'uint8' if int(maxval) < 256 else byteorder+'u2'
     arr = numpy.frombuffer(buffer, dtype=dtype,
-                           count=int(width)*int(height)*3,
+                           count=int(numpy.prod(shape)),
                            offset=len(header))
 
-    return arr.reshape((int(height), int(width), 3))
+    return arr.reshape(shape)
+
+def read_ppm(stream, rows_callback=None, byteorder='>', block_size=2**18):
+    """ Reads a raw PGM/PPM image from a binary stream (a file, or the stdout
+    of POV-Ray) as a numpy array, without buffering the whole image.
+
+    The header is read first, then the pixels are read directly into the
+    preallocated array, block by block. If provided, ``rows_callback`` is
+    called as ``rows_callback(image, n_rows)`` each time new rows have been
+    read, where the first ``n_rows`` rows of ``image`` are filled. An
+    exception raised by the callback is raised once the whole image is read.
+    """
+    numpy = import_numpy("Function read_ppm")
+    callback_errors = []
+    rows_callback = _guarded(rows_callback, callback_errors)
+
+    magic = stream.read(2)
+    if magic not in (b'P5', b'P6'):
+        raise ValueError("Not a raw PPM/PGM stream (starts with %r)" % magic)
+    width, height, maxval = [_read_ppm_number(stream) for _ in range(3)]
+
+    shape = _ppm_shape(magic, width, height)
+    dtype = 'uint8' if maxval < 256 else byteorder+'u2'
+    image = numpy.empty(shape, dtype=dtype)
+    data = memoryview(image.reshape(-1).view(numpy.uint8))
+    row_size = len(data) // height if height else 1
+    block_size = max(row_size, block_size - block_size % row_size)
+    position = rows = 0
+    while position < len(data):
+        n = stream.readinto(data[position:position + block_size])
+        if not n:
+            raise ValueError("The PPM/PGM image is truncated: %d/%d rows "
+                             "read." % (position // row_size, height))
+        position += n
+        if rows_callback is not None and position // row_size > rows:
+            rows = position // row_size
+            rows_callback(image, rows)
+    if callback_errors:
+        raise callback_errors[0]
+    return image
+
+def _guarded(callback, errors):
+    """ Returns the callback, made to store its exception in ``errors``
+    (to be raised later) and to stop being called after one. """
+    if callback is None:
+        return None
+    def guarded(*args):
+        if not errors:
+            try:
+                callback(*args)
+            except Exception as error:
+                errors.append(error)
+    return guarded
+
+def _ppm_shape(magic, width, height):
+    return (height, width) if magic == b'P5' else (height, width, 3)
+
+def _read_ppm_number(stream):
+    """ Reads a number of a PPM header, skipping the whitespace and comments
+    before it, and the whitespace character after it. """
+    c = stream.read(1)
+    while c.isspace() or c == b'#':
+        if c == b'#':
+            while c not in (b'\n', b'\r', b''):
+                c = stream.read(1)
+        c = stream.read(1)
+    digits = b''
+    while c.isdigit():
+        digits += c
+        c = stream.read(1)
+    if not digits:
+        raise ValueError("Invalid PPM/PGM header")
+    return int(digits)
+
+def numpy_to_png(image, filename=None):
+    """ Writes a numpy image (8 or 16 bits, gray, gray+alpha, RGB or RGBA) as
+    a PNG file, or returns the PNG data if no filename is provided. """
+
+    numpy = import_numpy("Function numpy_to_png")
+    image = numpy.asarray(image)
+    if image.ndim == 2:
+        image = image[:, :, None]
+    height, width, channels = image.shape
+    bit_depth = 16 if image.dtype.itemsize == 2 else 8
+    color_type = {1: 0, 2: 4, 3: 2, 4: 6}[channels]
+    rows = image.astype('>u2' if bit_depth == 16 else 'u1')
+    rows = rows.reshape((height, -1)).view('u1')
+    # each row starts with its filter type (0, no filter)
+    raw = numpy.hstack([numpy.zeros((height, 1), dtype='u1'), rows])
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    png = b''.join([b'\x89PNG\r\n\x1a\n',
+                    chunk(b'IHDR', struct.pack('>IIBBBBB', width, height,
+                                               bit_depth, color_type, 0, 0, 0)),
+                    chunk(b'IDAT', zlib.compress(raw.tobytes())),
+                    chunk(b'IEND', b'')])
+    if filename is None:
+        return png
+    with open(filename, 'wb') as f:
+        f.write(png)
+
+@contextmanager
+def private_directory(remove=True):
+    """ Creates a new temporary directory for the files of one render, and
+    deletes it afterwards unless ``remove`` is False. """
+    path = tempfile.mkdtemp(prefix='vapory_')
+    try:
+        yield path
+    finally:
+        if remove:
+            shutil.rmtree(path, ignore_errors=True)
+
+def ipython_image(filename=None, data=None):
+    """ Returns an IPython Image of the PNG file or data (IPython is imported
+    here, as it is slow to import and only needed in notebooks). """
+    try:
+        from IPython.display import Image
+    except ImportError:
+        raise IOError("The 'ipython' option only works in the IPython Notebook.")
+    return Image(filename=filename, data=data, format='png')
+
+def render_options(height=None, width=None, quality=None, antialiasing=None,
+                   output_alpha=False, threads=None, povray_options=None,
+                   show_window=False, includedirs=None):
+    """ Returns the POV-Ray command-line options for the render parameters
+    of ``render_povstring``. """
+    options = []
+    if height is not None: options.append('+H%d'%height)
+    if width is not None: options.append('+W%d'%width)
+    if quality is not None: options.append('+Q%d'%quality)
+    if antialiasing is not None: options.append('+A%f'%antialiasing)
+    if output_alpha: options.append('Output_Alpha=on')
+    if threads is not None: options.append('+WT%d'%threads)
+    if povray_options is not None: options.extend(povray_options)
+    options.append('+D' if show_window else '-D')
+    if includedirs is not None:
+        for dir in includedirs:
+            options.append('+L%s'%dir)
+    return options
+
+class RenderCancelled(IOError):
+    """ Raised when a render is cancelled through its ``cancel`` event. """
+
+class RenderTimeout(RenderCancelled):
+    """ Raised when a render is stopped after its ``timeout``. """
+
+class RenderProgress:
+    """ The status of a running render, passed to the progress callbacks.
+
+    Attributes
+    -----------
+
+    phase
+      'parsing', 'photons', 'radiosity' or 'rendering'.
+
+    done, total
+      Progress in the phase, e.g. pixels rendered and pixels in the image
+      (tokens parsed, in thousands, when parsing). ``total`` is None when
+      POV-Ray does not tell it.
+
+    rows
+      Number of rows of the image rendered (None outside of 'rendering').
+
+    message
+      The status line of POV-Ray.
+    """
+    __slots__ = ('phase', 'done', 'total', 'rows', 'message')
+
+    def __init__(self, phase, done=None, total=None, rows=None, message=''):
+        self.phase = phase
+        self.done = done
+        self.total = total
+        self.rows = rows
+        self.message = message
+
+    @property
+    def fraction(self):
+        """ Fraction (between 0 and 1) of the phase done, or None. """
+        if self.done is None or not self.total:
+            return None
+        return min(1.0, 1.0 * self.done / self.total)
+
+    def __repr__(self):
+        return "RenderProgress(%r, %r, %r)" % (self.phase, self.done,
+                                               self.total)
+
+# Status lines of POV-Ray (3.6 and 3.7), as (phase, regular expression
+# matching the progress 'done' of 'total' if any).
+_STATUS_LINES = [
+    ('parsing', re.compile(r'Pars(?:ing|e)\D*?(\d+)K tokens'), 'K'),
+    ('parsing', re.compile(r'\[Parsing'), None),
+    ('photons', re.compile(r'[Pp]hoton\D*(?:(\d+)\D+?of\D*?(\d+))?'), None),
+    ('radiosity', re.compile(r'[Rr]adiosity\D*(?:(\d+)\D+?of\D*?(\d+))?'),
+     None),
+    ('rendering', re.compile(r'Rendered (\d+) of (\d+) pixels'), 'pixels'),
+    ('rendering', re.compile(r'Rendering line (\d+) of (\d+)'), 'lines'),
+    ('rendering', re.compile(r'\[Rendering'), None),
+]
+
+def parse_status_line(line, width=None):
+    """ Returns the RenderProgress described by a status line of POV-Ray,
+    or None. ``width`` (in pixels) gives the rows rendered from the pixels
+    rendered. """
+    if ':' in line:
+        return None # statistics ("Photon Time: ..."), warnings, errors
+    for phase, pattern, unit in _STATUS_LINES:
+        match = pattern.search(line)
+        if match is None:
+            continue
+        numbers = [int(n) for n in match.groups() if n is not None]
+        done, total = (numbers + [None, None])[:2]
+        rows = None
+        if unit == 'lines':
+            rows = done
+        elif unit == 'pixels' and width:
+            rows = done // width
+        return RenderProgress(phase, done, total, rows, line.strip())
+    return None
+
+def _read_stderr(stream, chunks, progress_callback=None, width=None):
+    """ Reads the stderr of POV-Ray into the list ``chunks``, calling the
+    progress callback on each status line, as they are printed. """
+    if progress_callback is None:
+        chunks.append(stream.read())
+        return
+    pending = b''
+    while True:
+        chunk = stream.read1(2**12)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        # status updates are rewritten in place with \r
+        lines = re.split(b'[\r\n]', pending + chunk)
+        pending = lines.pop()
+        for line in lines:
+            status = parse_status_line(line.decode('ascii', 'replace'), width)
+            if status is not None:
+                progress_callback(status)
+    chunks[:] = [b''.join(chunks)]
+
+def run_povray(cmd, source=None, read_stdout=None, progress_callback=None,
+               width=None, cancel=None, timeout=None):
+    """ Runs a POV-Ray command and returns ``(returncode, stdout, stderr)``.
+
+    If ``source`` (a string or a Scene) is provided, it is streamed into the
+    stdin of the process chunk by chunk, while the outputs are being read, so
+    POV-Ray starts parsing before the scene is fully serialized.
+
+    If ``read_stdout`` is provided, ``stdout`` is what it returns when called
+    on the stdout pipe of the process (e.g. the image decoded by read_ppm),
+    or None if POV-Ray failed.
+
+    ``progress_callback(progress)`` is called with a RenderProgress each time
+    POV-Ray prints its status. Exceptions of the callbacks are raised once
+    POV-Ray has exited (unless it failed). POV-Ray is stopped, and RenderCancelled is
+    raised, when the ``cancel`` event (a threading.Event) is set, or after
+    ``timeout`` seconds (RenderTimeout).
+    """
+    if cancel is not None and cancel.is_set():
+        raise RenderCancelled("The render was cancelled before it started.")
+    deadline = None if timeout is None else time.monotonic() + timeout
+    process = subprocess.Popen(cmd, stderr=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stdin=(subprocess.DEVNULL if source is None
+                                      else subprocess.PIPE))
+    errors = []
+    stderr = []
+    callback_errors = []
+
+    def feed_stdin():
+        try:
+            write_chunks(iter_chunks(source), process.stdin)
+        except BrokenPipeError:
+            pass # POV-Ray stopped reading, its stderr will tell why.
+        except Exception as error:
+            errors.append(error)
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    finished = threading.Event()
+    stopped = []
+
+    def watch():
+        while not finished.wait(0.05):
+            if cancel is not None and cancel.is_set():
+                stopped.append(RenderCancelled("The render was cancelled."))
+            elif deadline is not None and time.monotonic() > deadline:
+                stopped.append(RenderTimeout(
+                    "The render took more than %s seconds." % timeout))
+            else:
+                continue
+            # POV-Ray gets a chance to exit cleanly before being killed.
+            process.terminate()
+            try:
+                process.wait(2)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            return
+
+    threads = [threading.Thread(target=_read_stderr, daemon=True,
+                                args=(process.stderr, stderr,
+                                      _guarded(progress_callback,
+                                               callback_errors), width))]
+    if source is not None:
+        threads.append(threading.Thread(target=feed_stdin, daemon=True))
+    if cancel is not None or deadline is not None:
+        threads.append(threading.Thread(target=watch, daemon=True))
+    for thread in threads:
+        thread.start()
+    stdout_error = None
+    try:
+        stdout = (read_stdout or _read_all)(process.stdout)
+    except Exception as error:
+        stdout, stdout_error = None, error
+        _read_all(process.stdout) # so that POV-Ray can exit
+    process.wait()
+    finished.set()
+    for thread in threads:
+        thread.join()
+    process.stdout.close()
+    process.stderr.close()
+
+    if stopped:
+        raise stopped[0]
+    if errors:
+        # The scene could not be serialized: that is the error to report.
+        raise errors[0]
+    if stdout_error is None and callback_errors:
+        stdout_error = callback_errors[0]
+    if stdout_error is not None and not process.returncode:
+        raise stdout_error
+    return process.returncode, stdout, stderr[0]
+
+def _read_all(stream):
+    return stream.read()
 
 def render_povstring(string, outfile=None, height=None, width=None,
                      quality=None, antialiasing=None, remove_temp=True,
                      show_window=False, temporarypovfile=None, includedirs=None,
-                     output_alpha=False):
+                     output_alpha=False, threads=None, povray_options=None,
+                     cache=None, rows_callback=None, progress_callback=None,
+                     cancel=None, timeout=None, return_stats=False,
+                     binary=None):
 
     """ Renders the provided scene description with POV-Ray.
 
@@ -65,8 +407,9 @@ def render_povstring(string, outfile=None, height=None, width=None,
     ------------
 
     string
-      A string representing valid POVRay code. Typically, it will be the result
-      of scene(*objects)
+      A string representing valid POVRay code, or an object that can stream
+      it through an ``iter_chunks`` method, typically a Scene. Scenes are
+      piped to POV-Ray chunk by chunk, never as one big string.
 
     outfile
       Name of the PNG file for the output.
@@ -87,154 +430,371 @@ def render_povstring(string, outfile=None, height=None, width=None,
     numpy array, due to limitations of the intermediate
     ppm format.
 
+    temporarypovfile
+      If provided, the scene is written to this .pov file (deleted after
+      the render if remove_temp is True) instead of being piped to POV-Ray.
+
+    threads
+      Number of render threads of POV-Ray (+WT), by default one per core.
+
+    povray_options
+      List of other command-line options for POV-Ray, e.g. ['+SR1', '+ER10']
+
+    cache
+      A RenderCache (or True for the default, memory-only, cache). If the
+      same scene was already rendered with the same options, the cached
+      result is returned and POV-Ray is not run.
+
+    rows_callback
+      When rendering to a numpy array, function called as
+      ``rows_callback(image, n_rows)`` each time new rows of the image are
+      received from POV-Ray, the first ``n_rows`` rows of ``image`` (the
+      array being filled) being complete.
+
+    progress_callback
+      Function called as ``progress_callback(progress)``, where progress is
+      a RenderProgress, each time POV-Ray prints its status (parsing,
+      photons and radiosity pretraces, pixels rendered).
+
+    cancel
+      A threading.Event: if it gets set (e.g. from another thread) POV-Ray is
+      stopped and RenderCancelled is raised.
+
+    timeout
+      Maximal duration of the render in seconds, after which POV-Ray is
+      stopped and RenderTimeout is raised.
+
+    return_stats
+      If True, returns ``(result, stats)`` where stats is the RenderStats
+      printed by POV-Ray (parse and trace times, rays, memory...), or None
+      if the result comes from the cache.
+
+    binary
+      The POV-Ray command, as a string or a list (by default
+      ``config.POVRAY_BINARY``).
+
     """
 
-    pov_file = temporarypovfile or '__temp__.pov'
-    with open(pov_file, 'w+') as f:
-        f.write(string)
+    if cache:
+        stats = []
+        result = get_cache(cache).render(
+            lambda outfile: _keep_stats(render_povstring(
+                string, outfile, height, width, quality, antialiasing,
+                remove_temp, show_window, temporarypovfile, includedirs,
+                output_alpha, threads, povray_options,
+                rows_callback=rows_callback,
+                progress_callback=progress_callback, cancel=cancel,
+                timeout=timeout, return_stats=True, binary=binary), stats),
+            string, outfile, dict(height=height, width=width, quality=quality,
+                                  antialiasing=antialiasing,
+                                  output_alpha=output_alpha,
+                                  povray_options=povray_options,
+                                  binary=binary),
+            list(includedirs or []))
+        return (result, stats[0] if stats else None) if return_stats else result
 
     return_np_array = (outfile is None)
     display_in_ipython = (outfile=='ipython')
 
     format_type = "P" if return_np_array else "N"
 
-    if return_np_array:
+    if return_np_array or display_in_ipython:
         outfile='-'
 
-    if display_in_ipython:
-        outfile = '__temp_ipython__.png'
-
-    cmd = [POVRAY_BINARY, pov_file]
-    if height is not None: cmd.append('+H%d'%height)
-    if width is not None: cmd.append('+W%d'%width)
-    if quality is not None: cmd.append('+Q%d'%quality)
-    if antialiasing is not None: cmd.append('+A%f'%antialiasing)
-    if output_alpha: cmd.append('Output_Alpha=on')
-    if not show_window:
-        cmd.append('-D')
-    else:
-        cmd.append('+D')
-    if includedirs is not None:
-        for dir in includedirs:
-            cmd.append('+L%s'%dir)
-    cmd.append("Output_File_Type=%s"%format_type)
-    cmd.append("+O%s"%outfile)
-    process = subprocess.Popen(cmd, stderr=subprocess.PIPE,
-                                    stdin=subprocess.PIPE,
-                                    stdout=subprocess.PIPE)
-
-    out, err = process.communicate(string.encode('ascii'))
-
-    if remove_temp:
-        os.remove(pov_file)
-
-    if process.returncode:
-        print(type(err), err)
+    # Unless a .pov file is requested, the scene is streamed into the stdin
+    # of POV-Ray while it is serialized, and nothing is written to disk.
+    # Windows builds of POV-Ray cannot read stdin, they get a .pov file
+    # written in a private directory, so simultaneous renders never collide.
+    use_pipe = (temporarypovfile is None) and (os.name != 'nt')
+    need_tempdir = (temporarypovfile is None) and not use_pipe
+
+    with (private_directory(remove=remove_temp) if need_tempdir
+          else nullcontext()) as tempdir:
+
+        if use_pipe:
+            pov_file = '+I-'
+        else:
+            pov_file = temporarypovfile or os.path.join(tempdir, '__temp__.pov')
+            with open(pov_file, 'w+') as f:
+                write_chunks(iter_chunks(string), f)
+
+        cmd = _command(binary or config.POVRAY_BINARY) + [pov_file] + render_options(
+            height, width, quality, antialiasing, output_alpha, threads,
+            povray_options, show_window, includedirs)
+        if need_tempdir:
+            # Files included by the scene are still looked up from the
+            # current directory, even though the .pov file is elsewhere.
+            cmd.append('+L%s'%os.getcwd())
+        cmd.append("Output_File_Type=%s"%format_type)
+        cmd.append("+O%s"%outfile)
+
+        returncode, out, err = run_povray(
+            cmd, string if use_pipe else None,
+            # the image is decoded as it arrives, not buffered as PPM data
+            (lambda stdout: read_ppm(stdout, rows_callback))
+            if return_np_array else None,
+            progress_callback, width, cancel, timeout)
+
+        if remove_temp and temporarypovfile:
+            os.remove(pov_file)
+
+    if returncode:
         raise IOError("POVRay rendering failed with the following error: "+err.decode('ascii'))
 
+    result = None
     if return_np_array:
-        return ppm_to_numpy(buffer=out)
+        result = out
 
     if display_in_ipython:
-        if not ipython_found:
-            raise("The 'ipython' option only works in the IPython Notebook.")
-        return Image(outfile)
+        result = ipython_image(data=out)
 
-def render_docker(string, outfile=None, height=None, width=None,
-                  quality=None, antialiasing=None,
-                  temporarypovfile=None, includedirs=None,
-                  output_alpha=False, resources_folder=None):
+    if return_stats:
+        return result, RenderStats.parse(err)
+    return result
 
-    pov_file = str(Path(temporarypovfile or '__temp__.pov').resolve())
-    with open(pov_file, 'w+') as f:
-        f.write(string)
+def _command(binary):
+    return [binary] if isinstance(binary, str) else list(binary)
 
-    return_np_array = (outfile is None)
-    display_in_ipython = (outfile == 'ipython')
+def _keep_stats(result_and_stats, stats):
+    result, render_stats = result_and_stats
+    stats.append(render_stats)
+    return result
 
-    format_type = "P" if return_np_array else "N"
+def render_povstring_animation(string, frames, clock=(0, 1), outfile=None,
+                               height=None, width=None, quality=None,
+                               antialiasing=None, cyclic=False,
+                               includedirs=None, output_alpha=False,
+                               threads=None, povray_options=None,
+                               poll_interval=0.05, binary=None):
+    """ Renders the frames of an animation in a single POV-Ray process, and
+    yields them, in order, as they are rendered.
 
-    if return_np_array:
-        outfile = '-'
+    The scene is parsed again at each frame, with the POV-Ray variable
+    ``clock`` going linearly from ``clock[0]`` at the first frame to
+    ``clock[1]`` at the last, but POV-Ray is started only once.
 
-    if display_in_ipython:
-        outfile = '__temp_ipython__.png'
-
-    if resources_folder is None:
-        tmp_path = tempfile.gettempdir()
-        resources_folder = Path(tmp_path).joinpath("empty_resources_folder")
-        resources_folder.mkdir(parents=True, exist_ok=True)
-
-    docker_output_directory = Path.home().joinpath('images') #Hardcoded in docker-compose.yml
-    docker_output_directory.mkdir(parents=True, exist_ok=True)
-
-    cmd = [
-        "bash",
-        f"{Path(__file__).parent.joinpath('docker_container/run_povray_container.sh')}",
-        f"{pov_file}"
-    ]
-    cmd.append(str(resources_folder))
-
-    if width is not None:
-        cmd.append(str(width))  # Convert to str
-    if height is not None:
-        cmd.append(str(height))  # Convert to str
-
-    extra_args = []
-    if quality is not None:
-        extra_args.append(f'+Q{quality}')
-    if antialiasing is not None:
-        extra_args.append(f'+A{antialiasing}')
-    if output_alpha:
-        extra_args.append('Output_Alpha=on')
+    Parameters
+    ------------
 
-    if includedirs is not None:
-        for dir in includedirs:
-            extra_args.append(f'+L{dir}')
-    extra_args.append(f"Output_File_Type={format_type}")
-    extra_args.append(f"+O{outfile}")
+    string
+      A string representing valid POVRay code, or an object that can stream
+      it through an ``iter_chunks`` method, typically a Scene.
+
+    frames
+      The numbers of the frames to render, e.g. ``range(1, 101)`` (the
+      POV-Ray variable ``frame_number``). They must be consecutive.
 
-    # Correctly extend extra_args into cmd
-    cmd.extend(extra_args)
-    print("Commande exécutée :", cmd)
+    clock
+      ``(initial, final)`` values of the ``clock`` variable.
 
-    process = subprocess.run(cmd, capture_output=True, text=True)
+    outfile
+      If None, the frames are yielded as numpy arrays. Otherwise the name of
+      the PNG files, either a pattern like "frames/img_%03d.png" or a name
+      like "img.png" to which the frame numbers are appended ("img001.png",
+      like POV-Ray does). The names of the files are yielded.
+
+    cyclic
+      If True, the last frame is one step before ``clock[1]``, so that the
+      animation loops smoothly (POV-Ray's +KC).
 
-    # Stocke et affiche les logs
-    logs = []
-    if process.stdout:
-        # print(process.stdout, end='')  # Affiche stdout
-        logs.extend(process.stdout.splitlines())  # Ajoute les lignes à la liste
+    poll_interval
+      Delay, in seconds, between two checks for newly rendered frames. A
+      frame is yielded once POV-Ray has started the next one, or exited.
 
-    if process.stderr:
-        # print(process.stderr, end='')  # Affiche stderr
-        logs.extend(process.stderr.splitlines())  # Ajoute les lignes à la liste
+    binary
+      The POV-Ray command, as a string or a list (by default
+      ``config.POVRAY_BINARY``).
 
-    # Vérifie si "Render failed" est présent dans les logs
-    if any("Render failed" in log for log in logs):
-        print("\n[Erreur détectée] Voici les logs complets :\n")
-        print("".join(logs))  # Affiche tous les logs
-        raise IOError("POVRay rendering failed due to 'Render failed' in logs.")
+    Other parameters are as in ``render_povstring``.
+    """
+    frames = range(frames) if isinstance(frames, int) else frames
+    first, last = _frame_bounds(frames)
+    if outfile is None:
+        import_numpy("Function render_povstring_animation")
+
+    options = ['+KFI%d' % first, '+KFF%d' % last,
+               '+KI%s' % float(clock[0]), '+KF%s' % float(clock[1])]
+    if cyclic: options.append('+KC')
+    options += render_options(height, width, quality, antialiasing,
+                              output_alpha, threads, povray_options,
+                              includedirs=includedirs)
+    options.append('+L%s'%os.getcwd())
+    options.append("Output_File_Type=%s" % ("P" if outfile is None else "N"))
+
+    # The frames are checked above, the render starts at the first next().
+    return _iter_animation(string, options, range(first, last + 1), outfile,
+                           poll_interval, _command(binary or
+                                                   config.POVRAY_BINARY))
+
+def _iter_animation(string, options, frames, outfile, poll_interval, command):
+    with private_directory() as tempdir:
+        # POV-Ray parses the scene again at each frame, so it cannot read
+        # it from a pipe: it is written in the private directory.
+        pov_file = os.path.join(tempdir, '__temp__.pov')
+        with open(pov_file, 'w+') as f:
+            write_chunks(iter_chunks(string), f)
+
+        cmd = (command + [pov_file] + options +
+               ["+O%s" % os.path.join(tempdir, 'frame')])
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE)
+        stderr = []
+        reader = threading.Thread(target=lambda: stderr.append(
+                                      process.stderr.read()), daemon=True)
+        reader.start()
+        try:
+            for frame, path in _finished_frames(process, tempdir, frames,
+                                                poll_interval):
+                if outfile is None:
+                    yield ppm_to_numpy(path)
+                    os.remove(path)
+                else:
+                    target = _frame_filename(outfile, frame, frames[-1])
+                    shutil.move(path, target)
+                    yield target
+        finally:
+            # Also reached when the caller stops iterating early.
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            reader.join()
+            process.stderr.close()
 
-    # Vérifie le code de retour du processus
     if process.returncode:
-        print("\n[Erreur détectée] Voici les logs complets :\n")
-        print("".join(logs))  # Affiche tous les logs
-        raise IOError(f"POVRay rendering failed with exit code {process.returncode}")
+        raise IOError("POVRay rendering failed with the following error: " +
+                      stderr[0].decode('ascii', 'replace'))
+
+def _frame_bounds(frames):
+    frames = list(frames)
+    if not frames:
+        raise ValueError("No frames to render.")
+    if frames != list(range(frames[0], frames[0] + len(frames))):
+        raise ValueError("The frames of an animation must be consecutive "
+                         "numbers, e.g. range(1, 101).")
+    return frames[0], frames[-1]
+
+def _finished_frames(process, directory, frames, poll_interval):
+    """ Yields ``(frame, path)`` for the frames written by POV-Ray in the
+    directory, once they are complete. Raises an IOError if POV-Ray exits
+    successfully without having written them all. """
+    pattern = re.compile(r'^frame(\d*)\.\w+$')
+    pending = list(frames)
+    while pending:
+        finished = process.poll() is not None
+        written = {}
+        for name in os.listdir(directory):
+            match = pattern.match(name)
+            if match:
+                # a single frame is not numbered by POV-Ray
+                number = int(match.group(1)) if match.group(1) else pending[0]
+                written[number] = os.path.join(directory, name)
+        # A frame is complete once POV-Ray has moved to the next one.
+        while pending and pending[0] in written and (
+                finished or any(n > pending[0] for n in written)):
+            frame = pending.pop(0)
+            yield frame, written[frame]
+        if finished:
+            if pending and not process.returncode:
+                raise IOError("POV-Ray exited without writing the frame(s) "
+                              "%d to %d." % (pending[0], pending[-1]))
+            return # the error of POV-Ray is raised by the caller
+        time.sleep(poll_interval)
+
+def _frame_filename(outfile, frame, last):
+    if '%' in outfile:
+        return outfile % frame
+    root, ext = os.path.splitext(outfile)
+    return '%s%0*d%s' % (root, len(str(last)), frame, ext)
 
-    if return_np_array:
-        return ppm_to_numpy(buffer=process.stdout)
+def render_docker(string, outfile=None, height=None, width=None,
+                  quality=None, antialiasing=None,
+                  temporarypovfile=None, includedirs=None,
+                  output_alpha=False, resources_folder=None, threads=None,
+                  povray_options=None, rows_callback=None,
+                  progress_callback=None, cancel=None, timeout=None,
+                  return_stats=False, image=None):
+    """ Renders the provided scene description with POV-Ray in a new docker
+    container (of ``image``, by default ``config.DOCKER_IMAGE``), removed
+    after the render.
+
+    The scene is piped to the container and, for numpy outputs, the PPM
+    image is read from its stdout straight into the array. PNG files are
+    written in a private folder mounted in the container, then moved to
+    ``outfile``, so simultaneous renders never collide.
 
-    if display_in_ipython:
-        if not ipython_found:
-            raise("The 'ipython' option only works in the IPython Notebook.")
-        return Image(outfile)
+    Parameters
+    ------------
 
-    parent_dir_folder = Path(outfile).parent
-    dir_file_name = Path(outfile).name
-    
+    resources_folder
+      Folder of the scene's resources (textures, includes...), mounted
+      read-only in the container, where POV-Ray runs.
 
-    shutil.move(str(docker_output_directory.joinpath('output.png')), str(Path(outfile).resolve()))
+    temporarypovfile
+      If provided, the scene is written to this .pov file, which POV-Ray
+      reads, instead of being piped.
+
+    includedirs
+      Include directories, as paths in the container.
+
+    Other parameters are as in ``render_povstring``.
+    """
+    return_np_array = (outfile is None)
+    display_in_ipython = (outfile == 'ipython')
+    name = 'vapory_%s' % uuid.uuid4().hex
+
+    with private_directory() as tempdir:
+        cmd = [config.DOCKER_BINARY, 'run', '--rm', '-i', '--name', name]
+        if resources_folder is not None:
+            cmd += ['-v', '%s:/resources:ro' % Path(resources_folder).resolve(),
+                    '-w', '/resources']
+        if temporarypovfile is not None:
+            with open(temporarypovfile, 'w+') as f:
+                write_chunks(iter_chunks(string), f)
+            cmd += ['-v', '%s:/vapory/input.pov:ro' %
+                    Path(temporarypovfile).resolve()]
+        if not (return_np_array or display_in_ipython):
+            cmd += ['-v', '%s:/vapory/output' % Path(tempdir).resolve()]
+        cmd.append(image or config.DOCKER_IMAGE)
+
+        cmd.append('+I-' if temporarypovfile is None else '+I/vapory/input.pov')
+        cmd += render_options(height, width, quality, antialiasing,
+                              output_alpha, threads, povray_options,
+                              includedirs=includedirs)
+        cmd.append("Output_File_Type=%s" % ("P" if return_np_array else "N"))
+        cmd.append("+O%s" % ('-' if (return_np_array or display_in_ipython)
+                             else '/vapory/output/output.png'))
+
+        try:
+            returncode, out, err = run_povray(
+                cmd, string if temporarypovfile is None else None,
+                (lambda stdout: read_ppm(stdout, rows_callback))
+                if return_np_array else None,
+                progress_callback, width, cancel, timeout)
+        except RenderCancelled:
+            # stopping the docker client does not always stop the container
+            subprocess.run([config.DOCKER_BINARY, 'rm', '-f', name],
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+            raise
+
+        if returncode:
+            raise IOError("POVRay rendering failed with the following error: "
+                          + err.decode('ascii', 'replace'))
+
+        result = None
+        if return_np_array:
+            result = out
+        elif display_in_ipython:
+            result = ipython_image(data=out)
+        else:
+            output_path = Path(outfile).resolve()
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(os.path.join(tempdir, 'output.png'), str(output_path))
+
+    if return_stats:
+        return result, RenderStats.parse(err)
+    return result
 
 def render_docker_windaube(
     string: str,
@@ -247,93 +807,23 @@ def render_docker_windaube(
     includedirs: Optional[List[str]] = None,
     output_alpha: bool = False,
     resources_folder: Optional[str] = None,
-) -> None:
+    threads: Optional[int] = None,
+    povray_options: Optional[List[str]] = None,
+    **options,
+):
     """
-    Renders a scene using Docker on Windows via a PowerShell script.
-
-    Args:
-        string (str): The scene description in POV-Ray format.
-        outfile (Optional[str]): The output file path for the rendered image.
-        height (Optional[int]): Image height in pixels.
-        width (Optional[int]): Image width in pixels.
-        quality (Optional[int]): Render quality setting.
-        antialiasing (Optional[float]): Antialiasing setting.
-        temporarypovfile (Optional[str]): Path to temporary POV-Ray file.
-        includedirs (Optional[List[str]]): Directories for additional include files.
-        output_alpha (bool): Whether to enable alpha channel in the output.
-        resources_folder (Optional[str]): Folder containing required resources.
-    """
-    pov_file = str(Path(temporarypovfile or '__temp__.pov').resolve())
-    with open(pov_file, 'w+', encoding='utf-8') as f:
-        f.write(string)
-
-    if resources_folder is None:
-        tmp_path = tempfile.gettempdir()
-        resources_folder = Path(tmp_path).joinpath("empty_resources_folder")
-        resources_folder.mkdir(parents=True, exist_ok=True)
-
-    docker_output_directory = Path.home().joinpath('images')
-    docker_output_directory.mkdir(parents=True, exist_ok=True)
-
-    extra_args = []
-    if quality is not None:
-        extra_args.append(f'+Q{quality}')
-    if antialiasing is not None:
-        extra_args.append(f'+A{antialiasing}')
-    else:
-        extra_args.append('-A')
-
-    if output_alpha:
-        extra_args.append('Output_Alpha=on')
-    if includedirs is not None:
-        for dir in includedirs:
-            extra_args.append(f'+L{dir}')
-    extra_args = ' '.join(extra_args)
-
-    # Préparation de la commande PowerShell
-    ps1_file = Path(__file__).parent.joinpath('docker_container/run_povray_container.ps1')
-    cmd = [
-        "powershell",
-        "-NoProfile",
-        "-ExecutionPolicy",
-        "Bypass",
-        "-File",
-        str(ps1_file),
-        "-InputFile", str(pov_file),
-        "-Resources", str(resources_folder),
-        "-Width", str(width or 1920),
-        "-Height", str(height or 1080),
-        "-ExtraParams", f"'{extra_args}'",
-    ]
-
-    print("Executing command:", " ".join(cmd))
-    process = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace", shell=False)
-
-    logs = []
-    if process.stdout:
-        logs.extend(process.stdout.splitlines())
-    if process.stderr:
-        logs.extend(process.stderr.splitlines())
-
-    if any("Render failed" in log for log in logs):
-        print("\n[Error detected] Logs:\n", "\n".join(logs))
-        raise IOError("POVRay rendering failed due to 'Render failed' in logs.")
-    
-    if any("Out of Memory" in log for log in logs):
-        print("\n[Error detected] Logs:\n", "\n".join(logs))
-        raise IOError("POVRay rendering failed due to 'Out of Memory' in logs.")
-
-    if process.returncode:
-        print("\n[Error detected] Logs:\n", "\n".join(logs))
-        raise IOError(f"POVRay rendering failed with exit code {process.returncode}")
+    Renders a scene using Docker on Windows.
 
-    output_path = Path(outfile).resolve()
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-
-    if not docker_output_directory.joinpath('output.png').exists():
-        print("\n[Error detected] Logs:\n", "\n".join(logs))
-        raise IOError("POVRay rendering failed due to 'Does not exist' in logs.")
-
-    shutil.move(str(docker_output_directory.joinpath('output.png')), str(output_path))
-
-    print(f"Rendered image saved to: {output_path}")
\ No newline at end of file
+    Deprecated: use ``render_docker``, which works on Windows too (the
+    docker CLI pipes the scene and the image the same way on every
+    platform). Kept for compatibility, with its former defaults: a
+    1920x1080 image, without antialiasing.
+    """
+    warnings.warn("render_docker_windaube is deprecated, use render_docker.",
+                  DeprecationWarning, stacklevel=2)
+    if antialiasing is None:
+        povray_options = list(povray_options or []) + ['-A']
+    return render_docker(string, outfile, height or 1080, width or 1920,
+                         quality, antialiasing, temporarypovfile,
+                         includedirs, output_alpha, resources_folder,
+                         threads, povray_options, **options)
@@ -0,0 +1,374 @@
+"""
+A render daemon: many processes send their scenes to one server, which
+queues them by priority, renders identical requests once, and runs a
+bounded number of POV-Ray processes.
+
+Start it with ``vapory serve`` (or ``python -m vapory serve``), and render
+with ``scene.render(..., server=address)``.
+"""
+
+import heapq
+import hashlib
+import itertools
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import tempfile
+import threading
+from .backends import RenderBackend, get_backend
+from .helpers import iter_chunks, import_numpy
+from .io import ipython_image, private_directory, RenderCancelled, RenderTimeout
+from .stats import RenderStats
+
+
+# Render options which can be sent to the server (callbacks and events
+# cannot).
+SERVER_OPTIONS = ['height', 'width', 'quality', 'antialiasing', 'includedirs',
+                  'output_alpha', 'povray_options', 'timeout']
+
+_ERRORS = {'RenderCancelled': RenderCancelled, 'RenderTimeout': RenderTimeout,
+           'ValueError': ValueError}
+
+
+def default_socket():
+    """ Returns the default path of the socket of the server,
+    ``vapory.sock`` in a directory only the user can access (created if
+    needed): ``$XDG_RUNTIME_DIR/vapory``, or ``vapory-<uid>`` in the
+    temporary directory. """
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        directory = os.path.join(os.environ['XDG_RUNTIME_DIR'], 'vapory')
+    else:
+        directory = os.path.join(tempfile.gettempdir(),
+                                 'vapory-%d' % os.getuid())
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or \
+            info.st_mode & 0o077:
+        raise IOError("%s must be a directory of the user, with permissions "
+                      "0700." % directory)
+    return os.path.join(directory, 'vapory.sock')
+
+
+class RenderServer:
+    """ A server rendering the scenes sent by RenderClients.
+
+    Requests are rendered by ``workers`` threads, each running one POV-Ray
+    process at a time with ``cores // workers`` render threads, highest
+    priority first. Requests identical to one being rendered or queued (same
+    POV-Ray code and options) wait for its result instead of being rendered
+    again.
+
+    Parameters
+    ------------
+
+    address
+      Path of a Unix socket, or ``(host, port)`` for TCP. By default, see
+      ``default_socket``.
+
+    workers
+      Number of simultaneous renders (default: one per core).
+
+    backend
+      The RenderBackend (or name of one) doing the renders, by default the
+      local POV-Ray.
+
+    Examples
+    ---------
+
+    >>> with RenderServer('/tmp/vapory.sock', workers=4) as server:
+    ...     server.serve_forever()
+    """
+
+    def __init__(self, address=None, workers=None, backend=None):
+        self.address = address = address or default_socket()
+        self.workers = workers or os.cpu_count() or 1
+        self.threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self.backend = get_backend(backend)
+        self.renders = 0 # number of renders actually run
+        self._queue = []
+        self._counter = itertools.count()
+        self._in_flight = {}
+        self._condition = threading.Condition()
+        self._closed = False
+        self._serving = False
+
+        if isinstance(address, str):
+            _remove_stale_socket(address)
+            server_class = socketserver.ThreadingUnixStreamServer
+        else:
+            server_class = socketserver.ThreadingTCPServer
+        self._server = server_class(address, _RequestHandler,
+                                    bind_and_activate=False)
+        self._server.allow_reuse_address = True
+        self._server.daemon_threads = True
+        try:
+            self._server.server_bind()
+            self._server.server_activate()
+        except BaseException:
+            self._server.server_close()
+            raise
+        self._server.render_server = self
+        for i in range(self.workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def serve_forever(self):
+        """ Serves the requests until ``shutdown`` is called. """
+        self._serving = True
+        self._server.serve_forever()
+
+    def start(self):
+        """ Serves the requests in a background thread, and returns. """
+        self._serving = True
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def shutdown(self):
+        """ Stops the server. Renders in progress are completed, the queued
+        ones fail with an IOError. """
+        if self._serving:
+            self._server.shutdown()
+        self._server.server_close()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            queued = [job for job in self._in_flight.values()
+                      if not job.started]
+            for job in queued:
+                del self._in_flight[job.key]
+            self._queue.clear()
+        for job in queued:
+            job.error = IOError("The render server was shut down.")
+            job.done.set()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def submit(self, code, options, kind='array', priority=0):
+        """ Queues the render of the POV-Ray code (bytes) and returns its
+        job, which can be waited for. An identical job already queued or
+        running is returned instead (its priority raised if needed). """
+        key = hashlib.sha1(code + json.dumps([options, kind], sort_keys=True)
+                           .encode()).hexdigest()
+        with self._condition:
+            job = self._in_flight.get(key)
+            if job is None:
+                job = self._in_flight[key] = _Job(key, code, options, kind)
+            elif job.started or priority <= job.priority:
+                return job
+            # a job with a higher priority is queued again: the worker
+            # popping it first renders it, the other entry is skipped.
+            job.priority = priority
+            heapq.heappush(self._queue, (-priority, next(self._counter), job))
+            self._condition.notify()
+        return job
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                job = heapq.heappop(self._queue)[2]
+                if job.started:
+                    continue
+                job.started = True
+            self._render(job)
+            with self._condition:
+                del self._in_flight[job.key]
+                self.renders += 1
+            job.done.set()
+
+    def _render(self, job):
+        options = dict(job.options)
+        options.setdefault('threads', self.threads)
+        code = job.code.decode('utf-8')
+        try:
+            if job.kind == 'array':
+                job.result, stats = self.backend.render(
+                    code, None, return_stats=True, **options)
+            else:
+                with private_directory() as tempdir:
+                    path = os.path.join(tempdir, 'output.png')
+                    _, stats = self.backend.render(code, path,
+                                                   return_stats=True,
+                                                   **options)
+                    with open(path, 'rb') as f:
+                        job.result = f.read()
+            job.stats = stats
+        except Exception as error:
+            job.error = error
+
+
+def _remove_stale_socket(path):
+    """ Removes the socket file left by a server which was killed. Raises
+    an IOError if the path is not a socket, or if a server listens on it. """
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise IOError("%s exists and is not a socket." % path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except ConnectionRefusedError:
+            os.remove(path)
+            return
+    raise IOError("A server is already listening on %s." % path)
+
+
+class _Job:
+    __slots__ = ('key', 'code', 'options', 'kind', 'priority', 'started',
+                 'done', 'result', 'stats', 'error')
+
+    def __init__(self, key, code, options, kind):
+        self.key = key
+        self.code = code
+        self.options = options
+        self.kind = kind
+        self.priority = float('-inf')
+        self.started = False
+        self.done = threading.Event()
+        self.result = self.stats = self.error = None
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        server = self.server.render_server
+        while True:
+            try:
+                header = _receive_header(self.request)
+            except EOFError:
+                return
+            code = _receive_payload(self.request)
+            job = server.submit(code, header['options'], header['kind'],
+                                header.get('priority', 0))
+            job.done.wait()
+            if job.error is not None:
+                _send(self.request, {'error': str(job.error),
+                                     'type': type(job.error).__name__})
+                continue
+            response = {'stats': job.stats and job.stats.as_dict()}
+            if job.kind == 'array':
+                response.update(dtype=job.result.dtype.str,
+                                shape=job.result.shape)
+                payload = [job.result.tobytes()]
+            else:
+                payload = [job.result]
+            _send(self.request, response, payload)
+
+
+class RenderClient(RenderBackend):
+    """ Sends the renders to a RenderServer. Used by
+    ``Scene.render(..., server=address)``, or as a backend.
+
+    Parameters
+    ------------
+
+    address
+      Path of the Unix socket of the server, or ``(host, port)`` (by
+      default, see ``default_socket``).
+
+    priority
+      Priority of the renders of this client (higher is rendered first).
+    """
+
+    def __init__(self, address=None, priority=0):
+        self.address = address or default_socket()
+        self.priority = priority
+
+    def cache_key(self):
+        return '%s %r' % (RenderBackend.cache_key(self), self.address)
+
+    def render(self, string, outfile=None, return_stats=False,
+               priority=None, **options):
+        """ Renders the scene (a Scene or a string of POV-Ray code) on the
+        server. Parameters and results are as in ``render_povstring``, but
+        callbacks and ``cancel`` are not supported. """
+        if outfile is None:
+            numpy = import_numpy("Rendering on a server to numpy")
+        header = {'options': {k: options[k] for k in SERVER_OPTIONS
+                              if options.get(k) is not None},
+                  'kind': 'array' if outfile is None else 'png',
+                  'priority': self.priority if priority is None else priority}
+
+        family = socket.AF_UNIX if isinstance(self.address, str) \
+            else socket.AF_INET
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.connect(self.address)
+            _send(sock, header, (chunk.encode('utf-8')
+                                 for chunk in iter_chunks(string)))
+            response = _receive_header(sock)
+            payload = _receive_payload(sock)
+
+        if 'error' in response:
+            raise _ERRORS.get(response['type'], IOError)(response['error'])
+        if outfile is None:
+            result = numpy.frombuffer(payload, dtype=response['dtype'])
+            result = result.reshape(response['shape'])
+        elif outfile == 'ipython':
+            result = ipython_image(data=bytes(payload))
+        else:
+            with open(outfile, 'wb') as f:
+                f.write(payload)
+            result = None
+        if return_stats:
+            stats = response['stats']
+            if stats is not None:
+                stats['intersections'] = {name: tuple(counts) for name, counts
+                                          in stats['intersections'].items()}
+                stats = RenderStats(**stats)
+            return result, stats
+        return result
+
+
+def _send(sock, header, chunks=()):
+    """ Sends a message: a JSON header, then a payload sent as a series of
+    chunks, each prefixed by its size, and ended by an empty chunk. """
+    header = json.dumps(header).encode('utf-8')
+    buffer = [struct.pack('>I', len(header)), header]
+    size = 0
+    for chunk in chunks:
+        if chunk:
+            buffer += [struct.pack('>I', len(chunk)), chunk]
+            size += len(chunk)
+        if size > 2**16:
+            sock.sendall(b''.join(buffer))
+            buffer, size = [], 0
+    buffer.append(struct.pack('>I', 0))
+    sock.sendall(b''.join(buffer))
+
+
+def _receive_header(sock):
+    size, = struct.unpack('>I', _receive_exactly(sock, 4))
+    return json.loads(_receive_exactly(sock, size).decode('utf-8'))
+
+
+def _receive_payload(sock):
+    payload = bytearray()
+    while True:
+        size, = struct.unpack('>I', _receive_exactly(sock, 4))
+        if not size:
+            return payload
+        payload += _receive_exactly(sock, size)
+
+
+def _receive_exactly(sock, size):
+    data = bytearray(size)
+    view = memoryview(data)
+    while view:
+        n = sock.recv_into(view)
+        if not n:
+            raise EOFError("Connection closed")
+        view = view[n:]
+    return data
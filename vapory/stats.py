@@ -0,0 +1,130 @@
+"""
+Statistics of the renders, parsed from the output of POV-Ray.
+"""
+
+import re
+
+_TIME = re.compile(r"^\s*(\w+(?: \w+)*) Time:\s+\d+ hours?\s+\d+ minutes?\s+"
+                   r"\d+ seconds? \(([\d.]+) seconds?\)"
+                   r"(?:\s*using (\d+) thread\(s\) with ([\d.]+) CPU-seconds)?",
+                   re.MULTILINE)
+
+_COUNTERS = {
+    'pixels': re.compile(r"^Pixels:\s+(\d+)", re.MULTILINE),
+    'samples': re.compile(r"Samples:\s+(\d+)"),
+    'rays': re.compile(r"^Rays:\s+(\d+)", re.MULTILINE),
+    'saved_rays': re.compile(r"Saved:\s+(\d+)"),
+    'shadow_ray_tests': re.compile(r"Shadow Ray Tests:\s+(\d+)"),
+    'peak_memory': re.compile(r"Peak memory used:\s+(\d+) bytes"),
+}
+
+_RESOLUTION = re.compile(r"Image Resolution (\d+) x (\d+)")
+_INTERSECTION = re.compile(r"^(\S.*?)\s+(\d+)\s+(\d+)(?:\s+[\d.]+)?\s*$")
+
+
+class RenderStats:
+    """ Statistics of a render, parsed from what POV-Ray prints on stderr.
+    Values not printed by POV-Ray (e.g. when the render failed) are None,
+    or missing from the dicts.
+
+    Attributes
+    -----------
+
+    times
+      Wall-clock durations in seconds, by phase: 'parse', 'bounding',
+      'photon', 'radiosity', 'trace', 'total'...
+
+    cpu_times
+      CPU durations in seconds (all threads), by phase.
+
+    threads
+      Number of threads used for the trace.
+
+    width, height
+      Resolution of the image.
+
+    pixels, samples, rays, saved_rays, shadow_ray_tests
+      Counters of the render.
+
+    intersections
+      ``{'Sphere': (tests, succeeded), 'Bounding Box': (...), ...}`` for the
+      ray/object intersection tests, by type of object.
+
+    peak_memory
+      Peak memory used by POV-Ray, in bytes.
+    """
+
+    def __init__(self, times=None, cpu_times=None, threads=None, width=None,
+                 height=None, pixels=None, samples=None, rays=None,
+                 saved_rays=None, shadow_ray_tests=None, intersections=None,
+                 peak_memory=None):
+        self.times = times or {}
+        self.cpu_times = cpu_times or {}
+        self.threads = threads
+        self.width = width
+        self.height = height
+        self.pixels = pixels
+        self.samples = samples
+        self.rays = rays
+        self.saved_rays = saved_rays
+        self.shadow_ray_tests = shadow_ray_tests
+        self.intersections = intersections or {}
+        self.peak_memory = peak_memory
+
+    @classmethod
+    def parse(cls, output):
+        """ Returns the RenderStats found in the output (bytes or str) of
+        POV-Ray. """
+        if isinstance(output, bytes):
+            output = output.decode('ascii', 'replace')
+        output = output.replace('\r', '\n')
+        stats = cls()
+        for name, seconds, threads, cpu_seconds in _TIME.findall(output):
+            phase = name.lower()
+            stats.times[phase] = float(seconds)
+            if cpu_seconds:
+                stats.cpu_times[phase] = float(cpu_seconds)
+            if threads and phase == 'trace':
+                stats.threads = int(threads)
+        for attr, pattern in _COUNTERS.items():
+            match = pattern.search(output)
+            if match:
+                setattr(stats, attr, int(match.group(1)))
+        match = _RESOLUTION.search(output)
+        if match:
+            stats.width, stats.height = int(match.group(1)), int(match.group(2))
+        stats.intersections = _parse_intersections(output)
+        return stats
+
+    def as_dict(self):
+        """ Returns the statistics as a dict (e.g. to be logged as JSON). """
+        return {attr: getattr(self, attr) for attr in
+                ['times', 'cpu_times', 'threads', 'width', 'height', 'pixels',
+                 'samples', 'rays', 'saved_rays', 'shadow_ray_tests',
+                 'intersections', 'peak_memory']}
+
+    def __repr__(self):
+        return "RenderStats(times=%r, rays=%r, peak_memory=%r)" % (
+            self.times, self.rays, self.peak_memory)
+
+
+def _parse_intersections(output):
+    """ Parses the table of the 'Ray->Shape Intersection' tests, which ends
+    with a line of dashes. """
+    intersections = {}
+    lines = output.split('\n')
+    for i, line in enumerate(lines):
+        if line.startswith('Ray->Shape Intersection'):
+            break
+    else:
+        return intersections
+    for line in lines[i + 1:]:
+        if line.startswith('---'):
+            if intersections:
+                break
+            continue # the line under the header of the table
+        match = _INTERSECTION.match(line)
+        if match:
+            name, tests, succeeded = match.groups()
+            intersections[name] = (int(tests), int(succeeded))
+    return intersections
@@ -1,10 +1,19 @@
 import os
-import webbrowser # <= to open the POVRay help
-from copy import deepcopy
+import sys
+from copy import copy as _copy
 import re
-from .io import render_docker, render_docker_windaube, render_povstring
+import hashlib
+from itertools import chain
+from .io import (render_docker, render_docker_windaube, render_povstring,
+                 render_povstring_animation, ipython_image, numpy_to_png)
+from .batch import render_tiles
+from .cache import get_cache
+from .backends import get_backend, backend_cache_key
+
+from .helpers import (WIKIREF, vectorize, format_if_necessary,
+                      write_chunks, update_hash, format_array,
+                      FormattedArray, import_numpy, value_format)
 
-from .helpers import WIKIREF, vectorize, format_if_necessary
 
 class Scene:
     """ A scene contains Items and can be written to a file.
@@ -19,7 +28,7 @@ class Scene:
     """
     def __init__(self, camera, objects=[], atmospheric=[],
                  included=[], defaults=[], global_settings=[],
-                 declares=[]):
+                 declares=[], deduplicate=False):
 
         self.camera = camera
         self.objects = objects
@@ -28,22 +37,112 @@ class Scene:
         self.defaults = defaults
         self.declares = declares
         self.global_settings = global_settings
+        self.deduplicate = deduplicate
 
-    def __str__(self):
+    def iter_chunks(self):
+        """ Yields the POV-Ray code of the scene piece by piece. Joining the
+        chunks gives ``str(scene)``, but the whole text is never in memory. """
+
+        if self.deduplicate:
+            yield from self.deduplicated().iter_chunks()
+            return
 
         included = ['#include "%s"'%e for e in self.included]
-        defaults = ['#default { %s }'%e for e in self.defaults]
         declares = ['#declare %s;'%e for e in self.declares]
 
-        global_settings = ["global_settings{\n%s\n}"%("\n".join(
-                           [str(e) for e in self.global_settings]))]
-        return '\n'.join([str(e)
-                          for l in  [included, declares, self.objects, [self.camera],
-                              self.atmospheric, global_settings]
-                          for e in l])
+        yield from _iter_joined(chain(included, declares, self.objects,
+                                      [self.camera], self.atmospheric), "\n")
+        yield "\nglobal_settings{\n"
+        yield from _iter_joined(self.global_settings, "\n")
+        yield "\n}"
+
+    def write_to(self, fileobj):
+        """ Writes the POV-Ray code of the scene to a (text or binary) file
+        object, e.g. an open file or the stdin of a process. """
+        write_chunks(self.iter_chunks(), fileobj)
+
+    def __str__(self):
+        return "".join(self.iter_chunks())
+
+    def deduplicated(self, min_count=2):
+        """ Returns a copy of the scene where every subtree appearing at least
+        ``min_count`` times is written once as a #declare, and referenced by
+        its identifier everywhere it appears.
+
+        The subtrees considered are textures, pigments, finishes, normals,
+        interiors and materials anywhere in the objects and atmospheric
+        effects, and whole objects (Sphere, Union...) placed in the scene or
+        in a CSG, compared through their content hash.
+        ``Scene(..., deduplicate=True)`` applies this automatically when the
+        scene is written or rendered.
+        """
+        counts = {}
+
+        def count(e, as_object):
+            key = _dedup_key(e, as_object)
+            if key is not None:
+                counts[key] = counts.get(key, 0) + 1
+                if counts[key] > 1:
+                    # the children of a repeated subtree are counted once.
+                    return
+            for child, child_as_object in _dedup_children(e):
+                count(child, child_as_object)
+
+        identifiers = {}
+        declares = []
+
+        def rewrite(e, as_object):
+            key = _dedup_key(e, as_object)
+            if key in identifiers:
+                return _dedup_reference(e, identifiers[key], as_object)
+            args = [rewrite(a, isinstance(e, _OBJECT_CONTAINERS))
+                    if isinstance(a, POVRayElement) else a for a in e.args]
+            if any(a is not b for a, b in zip(args, e.args)):
+                e = _copy(e)
+                e.args = tuple(args)
+                e._content_hash = None
+            if key is not None and counts[key] >= min_count:
+                identifiers[key] = "vapory_%s_%d" % (
+                    e.transformed_name().lower(), len(identifiers))
+                declares.append("%s = %s" % (identifiers[key], e))
+                return _dedup_reference(e, identifiers[key], as_object)
+            return e
+
+        roots = [(e, True) for e in self.objects] + [(e, False)
+                                                     for e in self.atmospheric]
+        for e, as_object in roots:
+            if isinstance(e, POVRayElement):
+                count(e, as_object)
+        objects, atmospheric = [
+            [rewrite(e, as_object) if isinstance(e, POVRayElement) else e
+             for e in l]
+            for l, as_object in [(self.objects, True), (self.atmospheric, False)]]
+
+        return Scene(self.camera, objects=objects, atmospheric=atmospheric,
+                     included=self.included, defaults=self.defaults,
+                     global_settings=self.global_settings,
+                     declares=self.declares + declares)
+
+    def content_hash(self):
+        """ Returns a hex digest of the content of the scene, computed from
+        the (cached) content hashes of its elements. Two scenes with the same
+        content hash give the same POV-Ray code. """
+        h = hashlib.sha1(b"Scene")
+        for l in [[self.camera], self.objects, self.atmospheric,
+                  self.included, self.defaults, self.global_settings,
+                  self.declares]:
+            update_hash(h, l)
+        return h.hexdigest()
 
     def copy(self):
-        return deepcopy(self)
+        """ Returns a copy of the scene which shares its elements with the
+        original (elements are never modified in place, see add_args). Only
+        the lists of the scene are copied. """
+        new = _copy(self)
+        for attr in ['objects', 'atmospheric', 'included', 'defaults',
+                     'global_settings', 'declares']:
+            setattr(new, attr, list(getattr(self, attr)))
+        return new
 
     def set_camera(self, new_camera):
         new = self.copy()
@@ -59,7 +158,11 @@ class Scene:
     def render(self, outfile=None, height=None, width=None,
                      quality=None, antialiasing=None, remove_temp=True,
                      auto_camera_angle=True, show_window=False, tempfile=None,
-                     includedirs=None, output_alpha=False, docker=False, resources_folder=None):
+                     includedirs=None, output_alpha=False, docker=False, resources_folder=None,
+                     threads=None, povray_options=None, tiles=None, jobs=None,
+                     cache=None, rows_callback=None, progress_callback=None,
+                     cancel=None, timeout=None, return_stats=False,
+                     backend=None, server=None):
 
         """ Renders the scene to a PNG, a numpy array, or the IPython Notebook.
 
@@ -85,36 +188,286 @@ class Scene:
         numpy array, due to limitations of the intermediate
         ppm format.
 
+        docker
+          True to render in a new docker container, or a DockerPool to
+          render in one of its running containers (much faster for small
+          renders, see ``vapory.docker_container.pool.DockerPool``).
+
+        threads
+          Number of render threads of POV-Ray, by default one per core.
+
+        povray_options
+          List of other command-line options for POV-Ray.
+
+        tiles
+          ``(nx, ny)`` to render the image as nx * ny tiles in ``jobs``
+          parallel POV-Ray processes (see ``render_tiles``), which are then
+          stitched together. Requires numpy.
+
+        cache
+          A RenderCache (or True for the default, memory-only, cache), so
+          that a scene already rendered with the same options is not
+          rendered again. See ``vapory.cache.RenderCache``.
+
+        rows_callback
+          When rendering to a numpy array, function called as
+          ``rows_callback(image, n_rows)`` as the rows of the image are
+          received from POV-Ray (see ``render_povstring``).
+
+        progress_callback, cancel, timeout
+          To follow the progress of the render, stop it from another thread
+          (with a threading.Event), or after a given number of seconds. See
+          ``render_povstring``.
+
+        return_stats
+          If True, returns ``(result, stats)``, where stats is a RenderStats
+          with the statistics printed by POV-Ray (times, rays, intersection
+          tests, peak memory). Stats are None for cached and tiled
+          renders.
+
+        backend
+          The renderer: a RenderBackend (see ``vapory.backends``), or the
+          name of one: 'local' (the default), 'docker' or 'fake' (a fake
+          POV-Ray, for tests and benchmarks). Overrides ``docker``.
+
+        server
+          Address of a render server started with ``vapory serve`` (path of
+          its Unix socket, or ``(host, port)``), or a RenderClient, to
+          render there instead of in this process. See ``vapory.server``.
+
         """
 
-        if auto_camera_angle and width is not None:
-            self.camera = self.camera.add_args(['right', [1.0*width/height, 0,0]])
+        if server is not None:
+            from .server import RenderClient
+            backend = server if isinstance(server, RenderClient) \
+                else RenderClient(server)
+
+        if cache:
+            stats = []
+
+            def render(outfile):
+                result, render_stats = self.render(
+                    outfile, height, width, quality, antialiasing, remove_temp,
+                    auto_camera_angle, show_window, tempfile, includedirs,
+                    output_alpha, docker, resources_folder, threads,
+                    povray_options, tiles, jobs, rows_callback=rows_callback,
+                    progress_callback=progress_callback, cancel=cancel,
+                    timeout=timeout, return_stats=True, backend=backend)
+                stats.append(render_stats)
+                return result
+
+            result = get_cache(cache).render(
+                render, self, outfile,
+                dict(height=height, width=width, quality=quality,
+                     antialiasing=antialiasing,
+                     auto_camera_angle=auto_camera_angle,
+                     output_alpha=output_alpha, povray_options=povray_options,
+                     backend=backend_cache_key(get_backend(
+                         backend, docker, resources_folder))),
+                list(includedirs or []) + [resources_folder])
+            if return_stats:
+                return result, (stats[0] if stats else None)
+            return result
+
+        if tiles is not None:
+            image = render_tiles(self, width, height, tiles, jobs,
+                                 quality=quality, antialiasing=antialiasing,
+                                 auto_camera_angle=auto_camera_angle,
+                                 includedirs=includedirs,
+                                 output_alpha=output_alpha, docker=docker,
+                                 resources_folder=resources_folder,
+                                 threads=threads, povray_options=povray_options,
+                                 cancel=cancel, timeout=timeout,
+                                 backend=backend)
+            if outfile is None:
+                result = image
+            elif outfile == 'ipython':
+                result = ipython_image(data=numpy_to_png(image))
+            else:
+                result = numpy_to_png(image, outfile)
+            return (result, None) if return_stats else result
+
+        scene = self._camera_fitted(width, height) if auto_camera_angle else self
+        backend = get_backend(backend, docker, resources_folder)
+        return backend.render(scene, outfile, height=height, width=width,
+                              quality=quality, antialiasing=antialiasing,
+                              remove_temp=remove_temp, show_window=show_window,
+                              temporarypovfile=tempfile,
+                              includedirs=includedirs,
+                              output_alpha=output_alpha,
+                              resources_folder=resources_folder,
+                              threads=threads, povray_options=povray_options,
+                              rows_callback=rows_callback,
+                              progress_callback=progress_callback,
+                              cancel=cancel, timeout=timeout,
+                              return_stats=return_stats)
+
+    def _camera_fitted(self, width, height):
+        """ Returns the scene with the camera's aspect ratio set to the image
+        ratio. The scene itself is left untouched, so it can be rendered
+        again (or simultaneously from other threads). """
+        if width is None:
+            return self
+        return self.set_camera(
+            self.camera.add_args(['right', [1.0*width/height, 0,0]]))
+
+    async def render_async(self, outfile=None, height=None, width=None,
+                           quality=None, antialiasing=None,
+                           auto_camera_angle=True, includedirs=None,
+                           output_alpha=False, threads=None,
+                           povray_options=None, semaphore=None):
+        """ Renders the scene like ``render``, in a coroutine which awaits
+        the POV-Ray process instead of blocking a thread.
+
+        At most ``config.MAX_ASYNC_RENDERS`` renders run at the same time
+        (the others wait for their turn), or as many as the ``semaphore``
+        provided allows. Cancelling the coroutine kills POV-Ray.
+        See ``vapory.aio.render_povstring_async``.
+
+        Examples
+        ---------
+
+        >>> images = await asyncio.gather(*[scene.render_async(width=300,
+        ...                                                    height=200)
+        ...                                 for scene in scenes])
+        """
+        # asyncio is only imported by the programs which use it.
+        from .aio import render_povstring_async
+        scene = self._camera_fitted(width, height) if auto_camera_angle else self
+        return await render_povstring_async(
+            scene, outfile, height, width, quality, antialiasing, includedirs,
+            output_alpha, threads, povray_options, semaphore)
+
+    def render_animation(self, frames, clock=(0, 1), outfile=None, height=None,
+                         width=None, quality=None, antialiasing=None,
+                         cyclic=False, auto_camera_angle=True,
+                         includedirs=None, output_alpha=False, threads=None,
+                         povray_options=None):
+        """ Renders the frames of an animation in a single POV-Ray process,
+        and yields them as numpy arrays (or as PNG files if ``outfile`` is
+        provided) while the next ones are being rendered.
+
+        Animate the scene with the POV-Ray variable ``clock`` (which goes
+        from ``clock[0]`` at the first frame to ``clock[1]`` at the last),
+        e.g. ``Rotate([0, '360*clock', 0])``.
+        See ``render_povstring_animation`` for the parameters.
+
+        POV-Ray writes the frames in a temporary folder, which is checked
+        every 50 milliseconds. A frame is yielded when POV-Ray has started
+        the next one (or exited), i.e. one frame behind the render. An
+        IOError is raised if frames are missing when POV-Ray exits.
+
+        Examples
+        ---------
+
+        >>> for i, image in enumerate(scene.render_animation(range(1, 101),
+        ...                                                 width=300, height=200)):
+        ...     process(image)
+        >>> files = list(scene.render_animation(range(1, 101),
+        ...                                     outfile='turntable_%03d.png'))
+        """
+        scene = self._camera_fitted(width, height) if auto_camera_angle else self
+        return render_povstring_animation(
+            scene, frames, clock, outfile, height, width, quality,
+            antialiasing, cyclic, includedirs, output_alpha, threads,
+            povray_options)
+
+    def render_preview(self, width, height, passes=((8, 3), (4, 5), (2, None)),
+                       quality=None, antialiasing=None, upscale=True,
+                       auto_camera_angle=True, **options):
+        """ Renders the scene progressively, and yields numpy images which
+        get better and better, for interactive work (notebooks, GUIs).
+
+        The first images are rendered at a fraction of the resolution, with
+        a low quality and no antialiasing, so they come in a fraction of the
+        time of the full render, which is the last image.
 
-        if docker:
-          if os.name != 'nt':
-            return render_docker(
-              str(self), outfile, height, width,
-              quality, antialiasing,tempfile, includedirs,
-              output_alpha,resources_folder
-            )
-          else:
-            return render_docker_windaube(
-                str(self), outfile, height, width,
-                quality, antialiasing,tempfile, includedirs,
-                output_alpha,resources_folder
-            )
-        else:
-          return render_povstring(str(self), outfile, height, width,
-                                quality, antialiasing, remove_temp, show_window,
-                                tempfile, includedirs, output_alpha)
+        Parameters
+        ------------
+
+        passes
+          The preview renders, as ``(scale, quality)``: the image is
+          rendered at ``1/scale`` of the resolution, with this POV-Ray
+          quality (None for the final ``quality``).
+
+        upscale
+          If True, all the images have size ``(height, width)``, the
+          previews being upscaled (nearest neighbour). If False, the
+          previews keep their smaller size.
+
+        Other options are as in ``Scene.render`` (threads, backend...).
+
+        Examples
+        ---------
+
+        >>> for image in scene.render_preview(1200, 800, quality=11,
+        ...                                   antialiasing=0.01):
+        ...     show(image)
+        """
+        numpy = import_numpy("Scene.render_preview")
+        # the camera of the full image, even if the previews' ratios are
+        # slightly different after rounding.
+        scene = self._camera_fitted(width, height) if auto_camera_angle else self
+        povray_options = list(options.pop('povray_options', None) or [])
+        for scale, pass_quality in passes:
+            w, h = max(1, width // scale), max(1, height // scale)
+            # -A: no antialiasing, whatever the povray.ini says
+            image = scene.render(width=w, height=h,
+                                 quality=(quality if pass_quality is None
+                                          else pass_quality),
+                                 povray_options=['-A'] + povray_options,
+                                 auto_camera_angle=False, **options)
+            if upscale:
+                rows = numpy.arange(height) * h // height
+                columns = numpy.arange(width) * w // width
+                image = image[rows[:, None], columns]
+            yield image
+        yield scene.render(width=width, height=height, quality=quality,
+                           antialiasing=antialiasing, auto_camera_angle=False,
+                           povray_options=povray_options or None, **options)
 
 
 class POVRayElement:
+    # The elements of vapory carry no __dict__: each class defines (empty)
+    # __slots__. Subclasses which do not define them get a __dict__, and
+    # can have other attributes.
+    __slots__ = ('args', '_content_hash')
+
     def __init__(self, *args):
-        self.args = list(args)
+        self.args = tuple([_compact(e) for e in args])
+        self._content_hash = None
+
+    def content_hash(self):
+        """ Returns a hex digest of the class and arguments of the element.
+
+        Sub-elements contribute their own content hash (Merkle-style) and the
+        result is cached, so elements are expected not to be modified once
+        created (use add_args, which returns a new element). Two elements
+        are equal if they have the same class and content hash.
+        """
+        if self._content_hash is None:
+            h = hashlib.sha1(("%s.%s" % (type(self).__module__,
+                                         type(self).__qualname__)).encode())
+            self._update_hash(h)
+            self._content_hash = h.hexdigest()
+        return self._content_hash
+
+    def _update_hash(self, h):
+        update_hash(h, self.args)
+
+    def __eq__(self, other):
+        if not isinstance(other, POVRayElement):
+            return NotImplemented
+        return (type(self) is type(other) and
+                self.content_hash() == other.content_hash())
+
+    def __hash__(self):
+        return hash(self.content_hash())
 
     def copy(self):
-        return deepcopy(self)
+        """ Returns a copy of the element which shares its sub-elements with
+        the original. """
+        return _copy(self)
 
     @classmethod
     def transformed_name(cls):
@@ -123,38 +476,73 @@ class POVRayElement:
 
     @classmethod
     def help(cls):
+        import webbrowser # <= to open the POVRay help
         webbrowser.open(WIKIREF + cls.transformed_name())
 
     def add_args(self, new_args):
         new = self.copy()
-        new.args += new_args
+        new.args = self.args + tuple([_compact(e) for e in new_args])
+        new._content_hash = None
         return new
 
-    def __str__(self):
+    def iter_chunks(self):
+        """ Yields the POV-Ray code of the element piece by piece """
         # Tranforms Sphere=>sphere, and LightSource=>light_source
-        name = self.transformed_name().lower()
+        yield "%s {\n" % self.transformed_name().lower()
+        yield from _iter_joined(self.args, "\n")
+        yield " \n}"
 
-        return "%s {\n%s \n}" % (name, "\n".join([str(format_if_necessary(e))
-                                                  for e in self.args]))
+    def __str__(self):
+        return "".join(self.iter_chunks())
 
 
 class POVRayMap(POVRayElement):
-    def __str__(self):
-        name = self.transformed_name().lower()
-        return "%s { %s }"%(name,
-                            "\n".join([ "[ %s ]"%(" ".join(
-                                [str(format_if_necessary(e)) for e in l]))
-                                        for l in self.args]))
+    __slots__ = ()
+
+    def iter_chunks(self):
+        yield "%s { " % self.transformed_name().lower()
+        for i, l in enumerate(self.args):
+            yield "\n[ " if i else "[ "
+            yield from _iter_joined(l, " ")
+            yield " ]"
+        yield " }"
 
 class Macro(POVRayElement):
     """ This special class enables to use macros like
     Tetrahedron_by_Corners(P,Q,R,S, R1, R2, filled), with the syntax
     Macro('Tetrahedron_by_Corners', P,Q,R,S,R1,R2, filled)
     """
-
-    def __str__(self):
-        return "%s( %s)"%(self.args[0], " , ".join([str(format_if_necessary(e))
-                                                   for e in self.args[1:]]))
+    __slots__ = ()
+
+    def iter_chunks(self):
+        yield "%s( " % self.args[0]
+        yield from _iter_joined(self.args[1:], " , ")
+        yield ")"
+
+
+def _compact(e):
+    """ Lighter storage for an argument: vectors given as lists become
+    tuples, and strings are interned so that keywords like 'color' or
+    'translate' are shared between all the elements. """
+    if type(e) is str:
+        return sys.intern(e)
+    if type(e) is list:
+        return tuple(e)
+    return e
+
+def _iter_joined(items, sep):
+    """ Streams the equivalent of sep.join(str(format_if_necessary(e))),
+    descending into the POV-Ray elements instead of stringifying them. """
+    prefix = ""
+    for e in items:
+        if (isinstance(e, POVRayElement) and
+                type(e).__str__ is POVRayElement.__str__):
+            if prefix:
+                yield prefix
+            yield from e.iter_chunks()
+        else:
+            yield prefix + str(format_if_necessary(e))
+        prefix = sep
 
 # =============================================================================
 # =============================================================================
@@ -176,6 +564,7 @@ class Spline(POVRayElement):
        SPLINE_USAGE:
          MySpline(Val) | MySpline(Val, SPLINE_TYPE)
     """
+    __slots__ = ()
 
 class Camera(POVRayElement):
     """Camera( *[CAMERA_ITEMS...] )
@@ -203,15 +592,18 @@ class Camera(POVRayElement):
        MESHCAM_SMOOTH:
          'optional', 'smooth'  'modifier', 'valid'  'only', 
          'when'  'using', 'mesh_camera' """
+    __slots__ = ()
 
 
 class Bokeh(POVRayElement):
     """Bokeh( Pigment() )
     """
+    __slots__ = ()
 
 
 class Background(POVRayElement):
   """Background(COLOR)"""
+  __slots__ = ()
 
 
 class Fog(POVRayElement):
@@ -222,12 +614,14 @@ class Fog(POVRayElement):
          'omega', Omega | 'lambda', Lambda | 'octaves', Octaves |
          'fog_offset', Fog_Offset | 'fog_alt', Fog_Alt |
          'up', [Fog_Up] | TRANSFORMATION"""
+    __slots__ = ()
 
 
 class SkySphere(POVRayElement):
     """SkySphere( *[SKY_SPHERE_IDENTIFIER],  *[SKY_SPHERE_ITEMS...] )
        SKY_SPHERE_ITEM:
          PIGMENT | TRANSFORMATION | *[emission]"""
+    __slots__ = ()
 
 
 class Rainbow(POVRayElement):
@@ -236,6 +630,7 @@ class Rainbow(POVRayElement):
          'direction', [Dir] | 'angle', Angle | 'width', Width |
          'distance', Distance | COLOR_MAP | 'jitter', Jitter | 'up', [Up] |
          'arc_angle', Arc_Angle | 'falloff_angle', Falloff_Angle"""
+    __slots__ = ()
 
 
 class LightSource(POVRayElement):
@@ -262,16 +657,19 @@ class LightSource(POVRayElement):
          'TRANSFORMATION', 'fade_distance'  Fade_Distance |
          'fade_power', Fade_Power | 'media_attenuation' ,  *[Bool] |
          'media_interaction' ,  *[Bool] | 'projected_through' """
+    __slots__ = ()
 
 
 class LooksLike(POVRayElement):
     """LooksLike(Object())
     """
+    __slots__ = ()
 
 
 class ProjectedThrough(POVRayElement):
     """ProjectedThrough(Object())
     """
+    __slots__ = ()
 
 
 class LightGroup(POVRayElement):
@@ -288,11 +686,13 @@ class LightGroup(POVRayElement):
        LIGHT_GROUP MODIFIER:
          global_lights BOOL | TRANSFORMATION"
     """
+    __slots__ = ()
 
 
 class Radiosity(POVRayElement):
     """Radiosity(*[Radiosity Items])
     """
+    __slots__ = ()
 
 
 class Photons(POVRayElement):
@@ -309,11 +709,13 @@ class Photons(POVRayElement):
          *[radius <gather_radius>, <multiplier>, <media>,<multiplier>]
          )"
     """
+    __slots__ = ()
 
 
 class Object(POVRayElement):
     """Object()
     """
+    __slots__ = ()
 
 
 class Blob(POVRayElement):
@@ -329,6 +731,7 @@ class Blob(POVRayElement):
          TEXTURE | PIGMENT | NORMAL | FINISH | TRANSFORMATION
        BLOB_MODIFIER:
          'hierarchy' ,  *[Boolean] | 'sturm' ,  *[Boolean] | OBJECT_MODIFIER"""
+    __slots__ = ()
 
 
 class Parametric(POVRayElement):
@@ -344,6 +747,7 @@ class Parametric(POVRayElement):
          *[precompute DEPTH, VarList]
          )"
     """
+    __slots__ = ()
 
 
 class Prism(POVRayElement):
@@ -357,6 +761,7 @@ class Prism(POVRayElement):
          'bezier_spline'  | 'linear_sweep'  | 'conic_sweep'
        PRISM_MODIFIER:
          'sturm'  | OBJECT_MODIFIER"""
+    __slots__ = ()
 
 
 class Sphere(POVRayElement):
@@ -364,6 +769,7 @@ class Sphere(POVRayElement):
            [Center], Radius
            *[OBJECT_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class SphereSweep(POVRayElement):
@@ -377,6 +783,7 @@ class SphereSweep(POVRayElement):
            *['tolerance', DEPTH_TOLERANCE]
            *[OBJECT_MODIFIERS]
            )"""
+    __slots__ = ()
 
 
 class Superellipsoid(POVRayElement):
@@ -384,6 +791,7 @@ class Superellipsoid(POVRayElement):
            [Value_E, Value_N]
            *[OBJECT_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class Sor(POVRayElement):
@@ -393,6 +801,7 @@ class Sor(POVRayElement):
            )
        SOR_MODIFIER:
          'sturm'  | OBJECT_MODIFIER"""
+    __slots__ = ()
 
 
 class Text(POVRayElement):
@@ -401,6 +810,7 @@ class Text(POVRayElement):
            Thickness, [Offset]
            *[OBJECT_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class Torus(POVRayElement):
@@ -410,6 +820,7 @@ class Torus(POVRayElement):
            )
        TORUS_MODIFIER:
          'sturm'  | OBJECT_MODIFIER"""
+    __slots__ = ()
 
 
 class Box(POVRayElement):
@@ -417,6 +828,7 @@ class Box(POVRayElement):
            [Corner_1], [Corner_2]
            *[OBJECT_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class Cone(POVRayElement):
@@ -424,6 +836,7 @@ class Cone(POVRayElement):
            [Base_Point], Base_Radius, [Cap_Point], Cap_Radius
            *[ 'open', ]*[OBJECT_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class Cylinder(POVRayElement):
@@ -431,6 +844,7 @@ class Cylinder(POVRayElement):
            [Base_Point], [Cap_Point], Radius
            *[ 'open', ]*[OBJECT_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class HeightField(POVRayElement):
@@ -449,6 +863,7 @@ class HeightField(POVRayElement):
          'smooth'  & 'water_level', Level
        OBJECT_MODIFIER:
          'hierarchy' ,  *[Boolean]"""
+    __slots__ = ()
 
 
 
@@ -464,12 +879,14 @@ class Isosurface(POVRayElement):
          *['max_trace', INTEGER] | *[all_intersections]
          *[OBJECT_MODIFIERS...]
          )"""
+    __slots__ = ()
 
 
 
 class ContainedBy(POVRayElement):
     """"ContainedBy( Object() )"
     """
+    __slots__ = ()
 
 
 
@@ -491,6 +908,7 @@ class JuliaFractal(POVRayElement):
            'sinh'  |           'asinh'  | 'cos'  | 'acos'  | 'cosh'  | 
            'acosh'  | 'tan'  | 'atan'  |tanh | 'atanh'  | 'ln'  | 
            Pwr( X_Val, Y_Val )"""
+    __slots__ = ()
 
 
 class Lathe(POVRayElement):
@@ -504,6 +922,7 @@ class Lathe(POVRayElement):
          'cubic_spline'  | 'bezier_spline'
        LATHE_MODIFIER:
          'sturm'  | OBJECT_MODIFIER"""
+    __slots__ = ()
 
 
 class Ovus(POVRayElement):
@@ -511,6 +930,7 @@ class Ovus(POVRayElement):
            Bottom_radius, Top_radius
            *[OBJECT_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class BicubicPatch(POVRayElement):
@@ -525,6 +945,7 @@ class BicubicPatch(POVRayElement):
        PATCH_ITEMS:
          'type', Patch_Type | 'u_steps', Num_U_Steps | 'v_steps', Num_V_Steps |
          'flatness', Flatness"""
+    __slots__ = ()
 
 
 class Disc(POVRayElement):
@@ -532,6 +953,7 @@ class Disc(POVRayElement):
            [Center], [Normal], Radius,  *[, Hole_Radius]
            *[OBJECT_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class Mesh(POVRayElement):
@@ -560,6 +982,7 @@ class Mesh(POVRayElement):
        MESH_MODIFIER:
          'inside_vector', [direction] | 'hierarchy' ,  *[ 'Boolean', ] |
          OBJECT_MODIFIER"""
+    __slots__ = ()
 
 
 
@@ -614,6 +1037,58 @@ class Mesh2(POVRayElement):
        MESH_MODIFIER :
          inside_vector [direction] | OBJECT_MODIFIERS"
     """
+    __slots__ = ()
+
+    @classmethod
+    def from_arrays(cls, vertices, faces, normals=None, uvs=None,
+                    texture_indices=None, textures=None):
+        """ Builds a Mesh2 from numpy arrays, written in one vectorized pass.
+
+        Gives the same code as the list-based form, e.g.
+        ``Mesh2(VertexVectors(n, [x1,y1,z1], ...), FaceIndices(m, ...))``.
+
+        Parameters
+        ------------
+
+        vertices, normals
+          (N, 3) arrays. Normals are per vertex (no normal_indices).
+
+        uvs
+          (N, 2) array of per-vertex uv vectors (no uv_indices).
+
+        faces
+          (M, 3) array of vertex indices.
+
+        texture_indices
+          (M,) or (M, 3) array of indices in ``textures``, a list of
+          Texture written as the texture_list of the mesh.
+
+        Other modifiers can be appended with ``add_args``.
+        """
+        numpy = import_numpy("Mesh2.from_arrays")
+
+        vertices = numpy.ascontiguousarray(vertices)
+        faces = numpy.ascontiguousarray(faces)
+        args = [VertexVectors(len(vertices), vertices)]
+        if normals is not None:
+            normals = numpy.ascontiguousarray(normals)
+            args.append(NormalVectors(len(normals), normals))
+        if uvs is not None:
+            uvs = numpy.ascontiguousarray(uvs)
+            args.append(UvVectors(len(uvs), uvs))
+        if textures is not None:
+            args.append(TextureList(len(textures), *textures))
+        if texture_indices is None:
+            args.append(FaceIndices(len(faces), faces))
+        else:
+            texture_indices = numpy.asarray(texture_indices).reshape(
+                                                               len(faces), -1)
+            row = "<%s>" % ",".join(["%s"] * faces.shape[1])
+            row += "\n%s" * texture_indices.shape[1]
+            indexed_faces = numpy.hstack([faces, texture_indices])
+            args.append(FaceIndices(len(faces),
+                                    FormattedArray(indexed_faces, row)))
+        return cls(*args)
 
 class FaceIndices(POVRayElement):
     """FaceIndices(
@@ -623,26 +1098,39 @@ class FaceIndices(POVRayElement):
          ...
          )
     """
+    __slots__ = ()
 
 
 class NormalIndices(POVRayElement):
     """
     """
+    __slots__ = ()
 
 
 class NormalVectors(POVRayElement):
     """
     """
+    __slots__ = ()
 
 
 class UvIndices(POVRayElement):
     """
     """
+    __slots__ = ()
 
 
 class VertexVectors(POVRayElement):
     """
     """
+    __slots__ = ()
+
+class UvVectors(POVRayElement):
+    """UvVectors(
+         number_of_uv_vectors,
+         [uv_vect1], [uv_vect2], ...
+         )
+    """
+    __slots__ = ()
 
 
 class Polygon(POVRayElement):
@@ -650,6 +1138,7 @@ class Polygon(POVRayElement):
            Number_Of_Points, [Point_1] [Point_2]... [Point_n]
            *[OBJECT_MODIFIER...]
            )"""
+    __slots__ = ()
 
 
 class Triangle(POVRayElement):
@@ -670,6 +1159,7 @@ class Triangle(POVRayElement):
          TextureList(
            'TEXTURE_IDENTIFIER', TEXTURE_IDENTIFIER TEXTURE_IDENTIFIER
            )"""
+    __slots__ = ()
 
 
 class SmoothTriangle(POVRayElement):
@@ -678,6 +1168,7 @@ class SmoothTriangle(POVRayElement):
          [Normal_2], [Corner_3], [Normal_3]
          *[OBJECT_MODIFIER...]
          )"""
+    __slots__ = ()
 
 
 class Plane(POVRayElement):
@@ -685,6 +1176,7 @@ class Plane(POVRayElement):
            [Normal], Distance
            *[OBJECT_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class Poly(POVRayElement):
@@ -694,6 +1186,7 @@ class Poly(POVRayElement):
            )
        POLY_MODIFIERS:
          'sturm'  | OBJECT_MODIFIER"""
+    __slots__ = ()
 
 
 class Cubic(POVRayElement):
@@ -701,6 +1194,7 @@ class Cubic(POVRayElement):
            [A1, A2, A3,... A20]
            *[POLY_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class Quartic(POVRayElement):
@@ -708,6 +1202,7 @@ class Quartic(POVRayElement):
            [A1, A2, A3,... A35]
            *[POLY_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class Polynomial(POVRayElement):
@@ -719,6 +1214,7 @@ class Polynomial(POVRayElement):
          Xyz([x_power],[y_power],[z_power]):[value]*[,]
        POLY_MODIFIERS:
          'sturm'  | OBJECT_MODIFIER"""
+    __slots__ = ()
 
 
 class Quadric(POVRayElement):
@@ -726,6 +1222,7 @@ class Quadric(POVRayElement):
            [A,B,C],[D,E,F],[G,H,I],J
            *[OBJECT_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class Union(POVRayElement):
@@ -733,6 +1230,7 @@ class Union(POVRayElement):
            OBJECTS...
            *[OBJECT_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class Intersection(POVRayElement):
@@ -740,6 +1238,7 @@ class Intersection(POVRayElement):
            SOLID_OBJECTS...
            *[OBJECT_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class Difference(POVRayElement):
@@ -747,6 +1246,7 @@ class Difference(POVRayElement):
            SOLID_OBJECTS...
            *[OBJECT_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class Merge(POVRayElement):
@@ -754,6 +1254,7 @@ class Merge(POVRayElement):
            SOLID_OBJECTS...
            *[OBJECT_MODIFIERS...]
            )"""
+    __slots__ = ()
 
 
 class ClippedBy(POVRayElement):
@@ -780,17 +1281,20 @@ class ClippedBy(POVRayElement):
          Photons( PHOTON_ITEMS...)
          Radiosity( RADIOSITY_ITEMS...)
          TRANSFORMATION"""
+    __slots__ = ()
 
 
 class BoundedBy(POVRayElement):
     """BoundedBy( UNTEXTURED_SOLID_OBJECT... ) |
          BoundedBy( 'clipped_by'  )"""
+    __slots__ = ()
 
 
 class Material(POVRayElement):
     """Material( *[MATERIAL_IDENTIFIER]*[MATERIAL_ITEMS...] )
        MATERIAL_ITEMS:
          TEXTURE | INTERIOR_TEXTURE | INTERIOR | TRANSFORMATIONS"""
+    __slots__ = ()
 
 
 class Texture(POVRayElement):
@@ -817,6 +1321,7 @@ class Texture(POVRayElement):
          TextureMap(
            TEXTURE_MAP_BODY
            )"""
+    __slots__ = ()
 
 
 class Pigment(POVRayElement):
@@ -846,6 +1351,7 @@ class Pigment(POVRayElement):
           'function', I_WIDTH, IHEIGHT( FUNCTION_IMAGE_BODY )
         FUNCTION_IMAGE_BODY:
           PIGMENT | FN_FLOAT | Pattern( PATTERN,  *[PATTERN_MODIFIERS] ) """
+    __slots__ = ()
 
 
 class ColorMap(POVRayMap):
@@ -855,11 +1361,13 @@ class ColorMap(POVRayMap):
        COLOR_MAP_ENTRY:
          *[ 'Value', COLOR ] |
          *[ Value_1, 'Value_2', 'color'  'COLOR_1', 'color'  'COLOR_2', ]"""
+    __slots__ = ()
 
 
 class ColourMap(POVRayMap):
     """
     """
+    __slots__ = ()
 
 
 class PigmentMap(POVRayMap):
@@ -868,6 +1376,7 @@ class PigmentMap(POVRayMap):
          PIGMENT_MAP_IDENTIFIER | PIGMENT_MAP_ENTRY...
        PIGMENT_MAP_ENTRY:
          *[ 'Value', PIGMENT_BODY ]"""
+    __slots__ = ()
 
 
 class Normal(POVRayElement):
@@ -884,6 +1393,7 @@ class Normal(POVRayElement):
        BUMP_MAP_MOD:
          'map_type', Type | 'once'  | 'interpolate', Type | 'use_color'  |
          'use_colour'  | 'bump_size', Value"""
+    __slots__ = ()
 
 
 class NormalMap(POVRayMap):
@@ -892,6 +1402,7 @@ class NormalMap(POVRayMap):
          NORMAL_MAP_IDENTIFIER | NORMAL_MAP_ENTRY...
        NORMAL_MAP_ENTRY:
          *[ 'Value', NORMAL_BODY ]"""
+    __slots__ = ()
 
 
 class SlopeMap(POVRayMap):
@@ -900,6 +1411,7 @@ class SlopeMap(POVRayMap):
          SLOPE_MAP_IDENTIFIER | SLOPE_MAP_ENTRY...
        SLOPE_MAP_ENTRY:
          *[ Value, [Height, Slope] ]"""
+    __slots__ = ()
 
 
 class BumpMap(POVRayElement):
@@ -917,6 +1429,7 @@ class BumpMap(POVRayElement):
          map_type Type | once | interpolate Type | use_color |
          use_colour | bump_size Value
     """
+    __slots__ = ()
 
 
 class Finish(POVRayElement):
@@ -936,6 +1449,7 @@ class Finish(POVRayElement):
          'metallic', FLOAT_METALLIC
        IRID_ITEMS:
          'thickness', Amount | 'turbulence', Amount"""
+    __slots__ = ()
 
 
 class Subsurface(POVRayElement):
@@ -943,6 +1457,7 @@ class Subsurface(POVRayElement):
         Subsurface( samples INT, INT )|
         Subsurface( radiosity BOOL )"
     """
+    __slots__ = ()
 
 
 class Reflection(POVRayElement):
@@ -954,12 +1469,14 @@ class Reflection(POVRayElement):
            *[metallic FLOAT_METALLIC]
            )
     """
+    __slots__ = ()
 
 
 class Irid(POVRayElement):
     """Irid( Irid_Amount,  *[IRID_ITEMS...] )
        IRID_ITEMS:
          'thickness', Amount | 'turbulence', Amount"""
+    __slots__ = ()
 
 
 class TextureList(POVRayElement):
@@ -987,6 +1504,7 @@ class TextureList(POVRayElement):
            TEXTURE_MAP_BODY
            )
     """
+    __slots__ = ()
 
 
 class TextureMap(POVRayMap):
@@ -995,6 +1513,7 @@ class TextureMap(POVRayMap):
          TEXTURE_MAP_IDENTIFIER | TEXTURE_MAP_ENTRY...
        TEXTURE_MAP_ENTRY:
          *[ 'Value', TEXTURE_BODY ]"""
+    __slots__ = ()
 
 
 class MaterialMap(POVRayElement):
@@ -1010,18 +1529,21 @@ class MaterialMap(POVRayElement):
        BITMAP_MOD:
          map_type Type | once | interpolate Type"
     """
+    __slots__ = ()
 
 
 
 class InteriorTexture(POVRayElement):
     """InteriorTexture([TextureItems...]):
     """
+    __slots__ = ()
 
 
 
 class PigmentPattern(POVRayElement):
     """PigmentPattern(PIGMENT_BODY)
     """
+    __slots__ = ()
 
 
 class Slope(POVRayElement):
@@ -1033,6 +1555,7 @@ class Slope(POVRayElement):
          *[PIGMENT_MODIFIERS...]
          )
     """
+    __slots__ = ()
 
 
 class ImagePattern(POVRayElement):
@@ -1048,6 +1571,7 @@ class ImagePattern(POVRayElement):
          ITEM_MAP_ENTRY:
          *[ GRAY_VALUE  ITEM_MAP_ENTRY... ]
     """
+    __slots__ = ()
 
 
 class Warp(POVRayElement):
@@ -1068,6 +1592,7 @@ class Warp(POVRayElement):
          'repeat', [Repeat] | 'turbulence', [Amount]
        TURB_ITEMS:
          'octaves', Count | 'omega', Amount | 'lambda', Amount"""
+    __slots__ = ()
 
 
 
@@ -1098,6 +1623,7 @@ class ImageMap(POVRayElement):
         FUNCTION_IMAGE_BODY:
           PIGMENT | FN_FLOAT | Pattern( PATTERN *[PATTERN_MODIFIERS] )
     """
+    __slots__ = ()
 
 
 class Media(POVRayElement):
@@ -1118,6 +1644,7 @@ class Media(POVRayElement):
          PATTERN_MODIFIER | DENSITY_LIST | COLOR_LIST |
          ColorMap( COLOR_MAP_BODY ) | ColourMap( COLOR_MAP_BODY ) |
          DensityMap( DENSITY_MAP_BODY )"""
+    __slots__ = ()
 
 
 class Interior(POVRayElement):
@@ -1127,12 +1654,14 @@ class Interior(POVRayElement):
          'dispersion_samples', Samples | 'fade_distance', Distance |
          'fade_power', Power | 'fade_color', [Color]
          MEDIA..."""
+    __slots__ = ()
 
 
 class Scattering(POVRayElement):
     """Scattering(
            Type, COLOR,  *[ 'eccentricity', Value ],  *[ 'extinction', Value ]
            )"""
+    __slots__ = ()
 
 
 class Density(POVRayElement):
@@ -1146,6 +1675,7 @@ class Density(POVRayElement):
          DENSITY_MODIFIER:
          PATTERN_MODIFIER | DENSITY_LIST | ColorMap( COLOR_MAP_BODY ) |
          ColourMap( COLOR_MAP_BODY ) | DensityMap( DENSITY_MAP_BODY )"""
+    __slots__ = ()
 
 
 class DensityMap(POVRayMap):
@@ -1154,3 +1684,181 @@ class DensityMap(POVRayMap):
          DENSITY_MAP_IDENTIFIER | DENSITY_MAP_ENTRY...
        DENSITY_MAP_ENTRY:
          *[ 'Value', DENSITY_BODY ]"""
+    __slots__ = ()
+
+
+# =============================================================================
+# Array-backed batches of primitives
+
+class POVRayArray(POVRayElement):
+    """ Base class for N objects of the same kind whose geometry (and,
+    optionally, colors and transformations) are stored in numpy columns.
+
+    The batch is a single item of ``Scene(objects=[...])`` but is written as N
+    objects, formatted by blocks of rows in a few vectorized passes. The
+    output is the same as a list of the equivalent objects, e.g. for a
+    SphereArray::
+
+        Sphere(centers[i], radii[i], *modifiers,
+               Pigment('color', colors[i]), 'matrix', matrices[i])
+
+    Parameters
+    ------------
+
+    *args
+      The columns of the primitive (see each class), one row per object,
+      followed by modifiers (Texture, Finish, 'translate'...) shared by all
+      the objects.
+
+    colors
+      Optional (N, 3) array (or (N, 4), (N, 5) for filter/transmit) giving
+      each object its own pigment color.
+
+    matrices
+      Optional (N, 4, 3) or (N, 12) array giving each object its own
+      transformation matrix, applied after the shared modifiers.
+    """
+
+    __slots__ = ('columns', 'colors', 'matrices')
+
+    element_class = None
+    # Number of values per object in each of the columns (1 for scalars)
+    column_sizes = ()
+    # Number of objects formatted at once when the batch is written
+    block_size = 10000
+
+    def __init__(self, *args, colors=None, matrices=None):
+        numpy = import_numpy(type(self).__name__)
+        n_columns = len(self.column_sizes)
+        POVRayElement.__init__(self, *args[n_columns:])
+        self.columns = tuple([
+            numpy.ascontiguousarray(column).reshape((-1, size))
+            for column, size in zip(args[:n_columns], self.column_sizes)])
+        n_objects = len(self.columns[0])
+        self.colors, self.matrices = [
+            None if column is None else
+            numpy.ascontiguousarray(column).reshape((n_objects, -1))
+            for column in (colors, matrices)]
+        if any(len(c) != n_objects for c in self._all_columns()):
+            raise ValueError("All the columns of a %s must have the same "
+                             "length." % type(self).__name__)
+
+    @classmethod
+    def transformed_name(cls):
+        return cls.element_class.transformed_name()
+
+    def _all_columns(self):
+        return [c for c in self.columns + (self.colors, self.matrices)
+                if c is not None]
+
+    def _row_template(self, formats=None):
+        """ Code of one object, with a "%s" (or the format of its column,
+        one per column of ``_all_columns``) for each value of the row """
+        formats = iter(formats or ["%s"] * len(self._all_columns()))
+        values = [next(formats) if size == 1 else
+                  "<%s>" % ",".join([next(formats)] * size)
+                  for size in self.column_sizes]
+        modifiers = [str(format_if_necessary(e)).replace("%", "%%")
+                     for e in self.args]
+        if self.colors is not None:
+            modifiers.append("pigment {\ncolor\n<%s> \n}" % ",".join(
+                [next(formats)] * self.colors.shape[1]))
+        if self.matrices is not None:
+            modifiers.append("matrix\n<%s>" % ",".join(
+                [next(formats)] * self.matrices.shape[1]))
+        return "%s {\n%s \n}" % (self.transformed_name().lower(),
+                                   "\n".join(values + modifiers))
+
+    def iter_chunks(self):
+        numpy = import_numpy(type(self).__name__)
+        # each column keeps its own format: an int column is not upcast to
+        # float by the float columns of the same block
+        formats, columns = zip(*[value_format(c)
+                                 for c in self._all_columns()])
+        row = self._row_template(formats)
+        for start in range(0, len(columns[0]), self.block_size):
+            block = numpy.hstack([c[start:start + self.block_size]
+                                  .astype(object) for c in columns])
+            yield ("\n" if start else "") + format_array(block, row=row)
+
+    def _update_hash(self, h):
+        update_hash(h, self.args)
+        update_hash(h, self._row_template())
+        update_hash(h, self._all_columns())
+
+
+class SphereArray(POVRayArray):
+    """SphereArray(
+           Centers, Radii
+           *[OBJECT_MODIFIERS...],
+           *[colors=Colors], *[matrices=Matrices]
+           )
+       Centers: (N, 3) array, Radii: (N,) array"""
+    __slots__ = ()
+
+
+    element_class = Sphere
+    column_sizes = (3, 1)
+
+
+class BoxArray(POVRayArray):
+    """BoxArray(
+           Corners_1, Corners_2
+           *[OBJECT_MODIFIERS...],
+           *[colors=Colors], *[matrices=Matrices]
+           )
+       Corners_1, Corners_2: (N, 3) arrays"""
+    __slots__ = ()
+
+
+    element_class = Box
+    column_sizes = (3, 3)
+
+
+class CylinderArray(POVRayArray):
+    """CylinderArray(
+           Base_Points, Cap_Points, Radii
+           *[ 'open', ]*[OBJECT_MODIFIERS...],
+           *[colors=Colors], *[matrices=Matrices]
+           )
+       Base_Points, Cap_Points: (N, 3) arrays, Radii: (N,) array"""
+    __slots__ = ()
+
+
+    element_class = Cylinder
+    column_sizes = (3, 3, 1)
+
+
+# =============================================================================
+# Classes considered by Scene.deduplicated
+
+_DEDUP_MODIFIERS = (Texture, Pigment, Finish, Normal, Interior, Material)
+
+_DEDUP_OBJECTS = (Object, Blob, Parametric, Prism, Sphere, SphereSweep,
+                  Superellipsoid, Sor, Text, Torus, Box, Cone, Cylinder,
+                  HeightField, Isosurface, JuliaFractal, Lathe, Ovus,
+                  BicubicPatch, Disc, Mesh, Mesh2, Polygon, Plane, Poly, Cubic,
+                  Quartic, Polynomial, Quadric, Union, Intersection,
+                  Difference, Merge)
+
+# The objects inside these can be replaced by ``object { IDENTIFIER }``
+_OBJECT_CONTAINERS = (Union, Intersection, Difference, Merge, ClippedBy,
+                      BoundedBy)
+
+def _dedup_key(e, as_object):
+    """ Structural key of the element, or None if it cannot be declared """
+    if isinstance(e, _DEDUP_MODIFIERS) or (as_object and
+                                           isinstance(e, _DEDUP_OBJECTS)):
+        return e.content_hash()
+    return None
+
+def _dedup_children(e):
+    as_object = isinstance(e, _OBJECT_CONTAINERS)
+    for a in e.args:
+        if isinstance(a, POVRayElement):
+            yield a, as_object
+
+def _dedup_reference(e, identifier, as_object):
+    if as_object and isinstance(e, _DEDUP_OBJECTS):
+        return Object(identifier)
+    return type(e)(identifier)